@@ -0,0 +1,65 @@
+import re
+import socket
+import sqlite3
+
+# Columns declared with these types are stored as integers and read back in canonical text form
+MAC_TYPE = 'MACADDR'
+IPV4_TYPE = 'IPV4'
+
+# The one notion of a well-formed MAC: six hex pairs separated by ':' or '-'. Kept as text too, for
+# engines with their own regex implementation (pyarrow.compute, see inventory.validateBatch)
+MAC_PATTERN = r'(?:[0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2}'
+MAC_REGEX = re.compile(MAC_PATTERN)
+
+def isValidMac(mac: str) -> bool:
+    return MAC_REGEX.fullmatch(mac) is not None
+
+class MacAddress(int):
+    # 48-bit MAC stored as an INTEGER; accepts any case with ':' or '-' separators
+    @staticmethod
+    def fromString(mac: str) -> 'MacAddress':
+        digits = mac.replace(':', '').replace('-', '').replace(' ', '')
+        if len(digits) != 12:
+            raise ValueError(f'Invalid MAC address: {mac}')
+        return MacAddress(int(digits, 16))
+
+    def __str__(self):
+        return macToStr(self)
+
+class IPv4Address(int):
+    # 32-bit IPv4 address stored as an INTEGER
+    @staticmethod
+    def fromString(ip: str) -> 'IPv4Address':
+        try:
+            return IPv4Address(int.from_bytes(socket.inet_aton(ip), 'big'))
+        except OSError:
+            raise ValueError(f'Invalid IPv4 address: {ip}')
+
+    def __str__(self):
+        return ipToStr(self)
+
+def macToStr(value: int) -> str:
+    digits = f'{value:012x}'
+    return f'{digits[0:2]}:{digits[2:4]}:{digits[4:6]}:{digits[6:8]}:{digits[8:10]}:{digits[10:12]}'
+
+def ipToStr(value: int) -> str:
+    return socket.inet_ntoa(value.to_bytes(4, 'big'))
+
+def canonicalMac(mac: str) -> str:
+    return macToStr(MacAddress.fromString(mac))
+
+def adapt(column, value):
+    # Wraps a text value bound for a mac/ip column in its storage type
+    if value is None or isinstance(value, (MacAddress, IPv4Address)):
+        return value
+    if column == 'mac':
+        return MacAddress.fromString(value)
+    if column == 'ip':
+        return IPv4Address.fromString(value)
+    return value
+
+def registerSqliteTypes() -> None:
+    sqlite3.register_adapter(MacAddress, int)
+    sqlite3.register_adapter(IPv4Address, int)
+    sqlite3.register_converter(MAC_TYPE, lambda value: macToStr(int(value)))
+    sqlite3.register_converter(IPV4_TYPE, lambda value: ipToStr(int(value)))
@@ -0,0 +1,21 @@
+import re
+
+# arp-scan prints one host per line: "<ip>\t<mac>[\t<vendor>]"; banner and summary lines never start with an IPv4 address.
+# Kept deliberately loose: the tight {1,3}/{2} repetitions cost more than they catch on arp-scan's own output.
+ARP_LINE = re.compile(r'^(\d+\.\d+\.\d+\.\d+)[ \t]+([0-9a-f:-]{17})', re.MULTILINE)
+
+def parseRecords(buffer): # bytes | str -> [(ip, mac)]
+    # One decode and one lower() over the whole capture instead of per line or per MAC
+    if isinstance(buffer, bytes):
+        buffer = buffer.decode('latin-1')
+    buffer = buffer.lower()
+
+    records = ARP_LINE.findall(buffer)
+
+    if any('-' in mac for _, mac in records):
+        records = [(ip, mac.replace('-', ':')) for ip, mac in records]
+
+    return records
+
+def parse(buffer): # bytes | str -> [{'ip': x, 'mac': x}]
+    return [{'ip': ip, 'mac': mac} for ip, mac in parseRecords(buffer)]
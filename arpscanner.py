@@ -0,0 +1,222 @@
+import asyncio
+import fcntl
+import ipaddress
+import socket
+import struct
+
+ETH_P_ARP = 0x0806
+ETH_P_IP = 0x0800
+ARP_REQUEST = 1
+ARP_REPLY = 2
+
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891b
+SIOCGIFHWADDR = 0x8927
+
+BROADCAST_MAC = b'\xff' * 6
+ZERO_MAC = b'\x00' * 6
+
+# Ethernet header followed by an IPv4-over-Ethernet ARP payload
+ARP_FRAME = struct.Struct('!6s6sHHHBBH6s4s6s4s')
+
+class ArpPacket:
+    __slots__ = ('op', 'senderMac', 'senderIp', 'targetMac', 'targetIp')
+
+    def __init__(self, op, senderMac, senderIp, targetMac, targetIp):
+        self.op = op
+        self.senderMac = senderMac
+        self.senderIp = senderIp
+        self.targetMac = targetMac
+        self.targetIp = targetIp
+
+def macToStr(mac: bytes) -> str:
+    return mac.hex(':')
+
+def buildArpFrame(op, senderMac, senderIp, targetMac, targetIp, destinationMac=BROADCAST_MAC) -> bytes:
+    return ARP_FRAME.pack(destinationMac, senderMac, ETH_P_ARP,
+                          1, ETH_P_IP, 6, 4, op,
+                          senderMac, socket.inet_aton(senderIp),
+                          targetMac, socket.inet_aton(targetIp))
+
+def parseArpFrame(frame: bytes):
+    if len(frame) < ARP_FRAME.size:
+        return None
+
+    (_, _, etherType, hardwareType, protocolType, hardwareSize, protocolSize, op,
+     senderMac, senderIp, targetMac, targetIp) = ARP_FRAME.unpack_from(frame)
+
+    if etherType != ETH_P_ARP or protocolType != ETH_P_IP or hardwareSize != 6 or protocolSize != 4:
+        return None
+
+    return ArpPacket(op, senderMac, socket.inet_ntoa(senderIp), targetMac, socket.inet_ntoa(targetIp))
+
+def getDefaultInterface():
+    try:
+        with open('/proc/net/route') as routeFile:
+            next(routeFile)
+            for line in routeFile:
+                fields = line.split()
+                if fields[1] == '00000000':
+                    return fields[0]
+    except OSError:
+        pass
+
+    return None
+
+def getInterfaceInfo(interface): # -> (mac bytes, ip, netmask)
+    packedName = struct.pack('256s', interface[:15].encode())
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as ioctlSocket:
+        fd = ioctlSocket.fileno()
+        mac = fcntl.ioctl(fd, SIOCGIFHWADDR, packedName)[18:24]
+        ip = socket.inet_ntoa(fcntl.ioctl(fd, SIOCGIFADDR, packedName)[20:24])
+        netmask = socket.inet_ntoa(fcntl.ioctl(fd, SIOCGIFNETMASK, packedName)[20:24])
+
+    return mac, ip, netmask
+
+class PacketTransport:
+    def __init__(self, interface=None):
+        self.interface = interface or getDefaultInterface()
+        if not self.interface:
+            raise OSError('No interface given and no default route found')
+
+        self.mac, self.ip, self.netmask = getInterfaceInfo(self.interface)
+
+        self.socket = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ARP))
+        self.socket.bind((self.interface, ETH_P_ARP))
+        self.socket.setblocking(False)
+
+    def network(self):
+        return ipaddress.IPv4Network(f'{self.ip}/{self.netmask}', strict=False)
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def send(self, frame) -> None:
+        self.socket.send(frame)
+
+    def recv(self):
+        try:
+            return self.socket.recv(65535)
+        except BlockingIOError:
+            return None
+
+    def close(self) -> None:
+        self.socket.close()
+
+class FakeTransport:
+    # In-memory responder: answers requests for the ip -> mac pairs in hosts
+    def __init__(self, hosts, network='192.168.0.0/24', ip='192.168.0.1', mac='02:00:00:00:00:01', interface='fake0'):
+        self.interface = interface
+        self.hosts = {ip: bytes.fromhex(hostMac.replace(':', '')) for ip, hostMac in hosts.items()}
+        self.mac = bytes.fromhex(mac.replace(':', ''))
+        self.ip = ip
+        self.fakeNetwork = ipaddress.IPv4Network(network, strict=False)
+        self.netmask = str(self.fakeNetwork.netmask)
+
+        self.socket, self.peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.peer.setblocking(False)
+
+    def network(self):
+        return self.fakeNetwork
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def send(self, frame) -> None:
+        packet = parseArpFrame(frame)
+
+        if packet and packet.op == ARP_REQUEST and packet.targetIp in self.hosts:
+            hostMac = self.hosts[packet.targetIp]
+            try:
+                self.peer.send(buildArpFrame(ARP_REPLY, hostMac, packet.targetIp,
+                                             packet.senderMac, packet.senderIp, packet.senderMac))
+            except BlockingIOError:
+                pass # a full queue behaves like a lost reply on the wire
+
+    def recv(self):
+        try:
+            return self.socket.recv(65535)
+        except BlockingIOError:
+            return None
+
+    def close(self) -> None:
+        self.socket.close()
+        self.peer.close()
+
+class ArpScanner:
+    def __init__(self, transport, rate=1000, retries=2, timeout=0.5):
+        self.transport = transport
+        self.rate = rate
+        self.retries = retries
+        self.timeout = timeout
+
+    def scan(self, targets=None): # -> [{'ip': x, 'mac': x}]
+        return asyncio.run(self.scanAsync(targets))
+
+    async def scanAsync(self, targets=None):
+        if targets is None:
+            targets = self.transport.network().hosts()
+        targets = [str(ip) for ip in targets if str(ip) != self.transport.ip]
+        targetSet = set(targets)
+
+        loop = asyncio.get_running_loop()
+        answered = {}
+        allAnswered = asyncio.Event()
+
+        def onReadable():
+            while True:
+                frame = self.transport.recv()
+                if frame is None:
+                    break
+
+                packet = parseArpFrame(frame)
+                if packet is None or packet.op != ARP_REPLY:
+                    continue
+
+                if packet.senderIp in targetSet and packet.senderIp not in answered:
+                    answered[packet.senderIp] = macToStr(packet.senderMac)
+                    if len(answered) == len(targetSet):
+                        allAnswered.set()
+
+        loop.add_reader(self.transport.fileno(), onReadable)
+
+        try:
+            for _ in range(self.retries + 1):
+                pending = [ip for ip in targets if ip not in answered]
+                if not pending:
+                    break
+
+                await self.__sendPaced(loop, pending)
+
+                try:
+                    await asyncio.wait_for(allAnswered.wait(), self.timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+        finally:
+            loop.remove_reader(self.transport.fileno())
+
+        return [{'ip': ip, 'mac': answered[ip]} for ip in targets if ip in answered]
+
+    async def __sendPaced(self, loop, pending) -> None:
+        interval = 1 / self.rate if self.rate else 0
+        start = loop.time()
+
+        for sent, ip in enumerate(pending, 1):
+            frame = buildArpFrame(ARP_REQUEST, self.transport.mac, self.transport.ip, ZERO_MAC, ip)
+
+            while True:
+                try:
+                    self.transport.send(frame)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(0.001)
+
+            # Sleep in steps of at least a millisecond so high rates are not dominated by timer overhead
+            delay = start + sent * interval - loop.time()
+            if delay >= 0.001:
+                await asyncio.sleep(delay)
+            elif sent % 64 == 0:
+                await asyncio.sleep(0)
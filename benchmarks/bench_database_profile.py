@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+from mainlite import Database, Table
+from synthetic import syntheticMac, syntheticIp
+
+ROWS = 2000
+LOOKUPS = 2000
+
+def runProfile(profile, directory):
+    database = Database(os.path.join(directory, f"{profile['profile']}.db"), 'knownEntries', 'unknownEntries', profile)
+    database.createTables()
+    table = Table(database.getUnknownTableName(), 0, database.getCursor(), database.getConnection())
+    timings = {}
+
+    # One commit per row, as -i and the single-row helpers do
+    start = time.perf_counter()
+    for n in range(ROWS):
+        table.insertRow(syntheticIp(n), syntheticMac(n))
+    timings['row commits'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with table.transaction():
+        table.updateColumnValuesById('time', [('2024-01-01 00:00:00', n) for n in range(1, ROWS + 1, 2)])
+    timings['batch update'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for n in range(LOOKUPS):
+        table.getEntryByColumn('ip', syntheticIp(n % ROWS))
+    timings['ip lookups'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(100):
+        database.getCursor().execute('SELECT count(*) FROM unknownEntries WHERE time < ?', ('2025-01-01 00:00:00',)).fetchone()
+    timings['time range'] = time.perf_counter() - start
+
+    database.getConnection().close()
+    return timings
+
+def main():
+    profiles = {
+        'default': Config({'database': {'profile': 'default'}}).get('database'),
+        'tuned': Config({'database': {'profile': 'tuned'}}).get('database'),
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = {name: runProfile(profile, directory) for name, profile in profiles.items()}
+
+    print(f"{'stage':>14}" + ''.join(f'{name:>12}' for name in results))
+    for stage in results['default']:
+        print(f'{stage:>14}' + ''.join(f'{results[name][stage]:>12.4f}' for name in results))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import synthetic
+from config import Config
+from mainlite import Database, Table, TableUpdater
+
+ROUNDS = 3
+STAGES = ('scan', 'parse', 'reconcile', 'commit', 'total')
+
+def runRound(directory, size, config):
+    # Every round starts from a pristine copy, so later rounds do not just refresh what the first one wrote
+    databasePath = os.path.join(directory, 'round.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(databasePath + suffix):
+            os.remove(databasePath + suffix)
+    shutil.copyfile(os.path.join(directory, f'arp-{size}.db'), databasePath)
+
+    database = Database(databasePath, 'knownEntries', 'unknownEntries', config.get('database'))
+    database.createTables()
+    connection = database.getConnection()
+    knownTable = Table(database.getKnownTableName(), 1, database.getCursor(), connection)
+    unknownTable = Table(database.getUnknownTableName(), 0, database.getCursor(), connection)
+    networker = synthetic.FakeNetworker(os.path.join(directory, f'capture-{size}.txt'))
+    tableUpdater = TableUpdater(knownTable, unknownTable, networker, config)
+
+    commitTime = [0.0]
+    commit = connection.commit
+    def timedCommit():
+        start = time.perf_counter()
+        commit()
+        commitTime[0] += time.perf_counter() - start
+    connection.commit = timedCommit
+
+    start = time.perf_counter()
+    tableUpdater.update(expire=True)
+    total = time.perf_counter() - start
+
+    tableUpdater.close()
+    connection.close()
+
+    timings = dict(networker.timings, commit=commitTime[0], total=total)
+    # Reconcile covers everything between the parsed scan and the commit: reads, diffing and the write statements
+    timings['reconcile'] = total - timings['scan'] - timings['parse'] - timings['commit']
+    return timings
+
+def runSize(directory, size, config):
+    rounds = [runRound(directory, size, config) for _ in range(ROUNDS)]
+    return {stage: min(timings[stage] for timings in rounds) for stage in STAGES}
+
+def compare(results, baselinePath):
+    with open(baselinePath) as baselineFile:
+        baseline = {str(result['size']): result['best'] for result in json.load(baselineFile)['results']}
+
+    print(f"\n{'hosts':>8}" + ''.join(f'{stage:>11}' for stage in STAGES) + '   (current / baseline)')
+    for result in results:
+        previous = baseline.get(str(result['size']))
+        if previous is None:
+            continue
+        print(f"{result['size']:>8}" + ''.join(f"{result['best'][stage] / previous[stage]:>10.2f}x" if previous.get(stage) else f"{'-':>11}"
+                                            for stage in STAGES))
+
+def main():
+    # bench_end_to_end.py [results.json] [baseline.json], results default to bench_end_to_end.json next to this script
+    outputPath = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_end_to_end.json')
+    baselinePath = sys.argv[2] if len(sys.argv) > 2 else None
+
+    # No event sinks, so nothing leaves the machine
+    config = Config({'events': {'sinks': []}})
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        synthetic.generate(directory)
+
+        print(f"{'hosts':>8}" + ''.join(f'{stage:>11}' for stage in STAGES))
+        for size in synthetic.SIZES:
+            best = runSize(directory, size, config)
+            results.append({'size': size, 'rounds': ROUNDS, 'best': best})
+            print(f'{size:>8}' + ''.join(f'{best[stage]:>11.4f}' for stage in STAGES))
+
+    with open(outputPath, 'w') as outputFile:
+        json.dump({
+            'benchmark': 'end-to-end',
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.platform(),
+            'results': results,
+        }, outputFile, indent=2)
+    print(f'Wrote {outputPath}')
+
+    if baselinePath:
+        compare(results, baselinePath)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mainlite import Database, Table
+from synthetic import syntheticMac, syntheticIp
+
+# The ip and time indexes measured directly: the same lookups on the same rows, with the indexes
+# and after dropping them. bench_database_profile compares connection settings on indexed tables,
+# so it cannot show what the indexes themselves are worth.
+
+ROWS = 50000
+LOOKUPS = 2000
+EXPIRIES = 200
+
+def populate(database):
+    database.getCursor().executemany(
+        'INSERT INTO unknownEntries (ip, mac, time) VALUES (?, ?, ?)',
+        [(syntheticIp(n), syntheticMac(n), f'2024-01-{1 + n % 28:02d} 00:00:00') for n in range(ROWS)])
+    database.getConnection().commit()
+
+def run(database):
+    table = Table(database.getUnknownTableName(), 0, database.getCursor(), database.getConnection())
+    timings = {}
+
+    start = time.perf_counter()
+    for n in range(LOOKUPS):
+        table.getEntryByColumn('ip', syntheticIp(n * 7919 % ROWS))
+    timings['ip lookups'] = time.perf_counter() - start
+
+    # The WHERE time < ? scan expireEntries runs, without deleting so every pass sees the same rows
+    start = time.perf_counter()
+    for n in range(EXPIRIES):
+        database.getCursor().execute('SELECT id FROM unknownEntries WHERE time < ?', (f'2024-01-{2 + n % 3:02d} 00:00:00',)).fetchall()
+    timings['time range'] = time.perf_counter() - start
+
+    return timings
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        database = Database(os.path.join(directory, 'arp.db'), 'knownEntries', 'unknownEntries')
+        database.createTables()
+        populate(database)
+
+        results = {'indexed': run(database)}
+
+        database.getCursor().execute('DROP INDEX unknownEntries_ip')
+        database.getCursor().execute('DROP INDEX unknownEntries_time')
+        database.getConnection().commit()
+        results['no index'] = run(database)
+
+        database.getConnection().close()
+
+    print(f"{'stage':>14}" + ''.join(f'{name:>12}' for name in results))
+    for stage in results['indexed']:
+        print(f'{stage:>14}' + ''.join(f'{results[name][stage]:>12.4f}' for name in results))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import arpparser
+
+LINES = 65536
+ROUNDS = 5
+
+def syntheticCapture(lines=LINES): # -> bytes shaped like `arp-scan -l -q` output
+    header = 'Interface: eth0, type: EN10MB, MAC: 02:00:00:00:00:01, IPv4: 10.0.0.1\nStarting arp-scan 1.10.0 with 65536 hosts\n'
+    hosts = '\n'.join(f'10.{(n >> 16) & 0xff}.{(n >> 8) & 0xff}.{n & 0xff}\t'
+                      f'{(n >> 16) & 0xff:02x}:00:5e:{(n >> 8) & 0xff:02x}:10:{n & 0xff:02x}' for n in range(lines))
+    footer = f'\n\n{lines} packets received by filter, 0 packets dropped by kernel\nEnding arp-scan 1.10.0: 65536 hosts scanned in 64.1 seconds. {lines} responded\n'
+    return (header + hosts + footer).encode()
+
+def perLineParse(arpOutput): # the former Networker.__convertToDict
+    pattern = r'(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\s+(?P<mac>[0-9a-fA-F:]{17})'
+
+    result = []
+    for line in arpOutput.decode().splitlines():
+        regexResult = re.search(pattern, line)
+        if regexResult:
+            result.append({'ip': regexResult.group('ip'), 'mac': regexResult.group('mac')})
+    return result
+
+def timeIt(function, capture):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = function(capture)
+        best = min(best, time.perf_counter() - start)
+    return best, len(result)
+
+def main():
+    capture = syntheticCapture()
+
+    print(f"{'parser':>22} {'best s':>10} {'records':>8}")
+    for name, function in (('per-line re.search', perLineParse),
+                           ('arpparser.parse', arpparser.parse),
+                           ('arpparser.parseRecords', arpparser.parseRecords)):
+        elapsed, records = timeIt(function, capture)
+        print(f'{name:>22} {elapsed:>10.4f} {records:>8}')
+
+if __name__ == '__main__':
+    main()
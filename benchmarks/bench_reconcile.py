@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from reconciler import Reconciler
+from synthetic import syntheticMac, syntheticIp
+
+SIZES = [1000, 10000, 100000]
+
+def buildInputs(size):
+    # A quarter known, a quarter already unknown, half of the network answers the scan
+    knownEntries = [{'id': n, 'mac': syntheticMac(n), 'ip': syntheticIp(n), 'name': f'device{n}'}
+                    for n in range(0, size, 4)]
+    unknownEntries = [{'id': n, 'mac': syntheticMac(n), 'ip': syntheticIp(n), 'time': '2024-01-01 00:00:00'}
+                      for n in range(1, size, 4)]
+    arpResult = [{'ip': syntheticIp(n + 1), 'mac': syntheticMac(n)} for n in range(0, size, 2)]
+
+    return knownEntries, unknownEntries, arpResult
+
+def main():
+    print(f"{'hosts':>8} {'seconds':>10} {'us/host':>10} {'deltas':>8}")
+
+    for size in SIZES:
+        knownEntries, unknownEntries, arpResult = buildInputs(size)
+
+        start = time.perf_counter()
+        delta = Reconciler.reconcile(knownEntries, unknownEntries, arpResult)
+        elapsed = time.perf_counter() - start
+
+        print(f'{size:>8} {elapsed:>10.4f} {elapsed / size * 1e6:>10.3f} {len(delta):>8}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mainlite import Database, Table
+
+ROWS = 100000
+
+def dictFactory(cursor, row): # the former Database.dict_factory
+    return {cursor.description[i][0]: row[i] for i in range(len(row))}
+
+def populate(database):
+    database.getCursor().executemany(
+        'INSERT INTO unknownEntries (ip, mac, time) VALUES (?, ?, ?)',
+        [((10 << 24) + n, (0x020000 << 24) + n, '2024-01-01 00:00:00') for n in range(ROWS)])
+    database.getConnection().commit()
+
+def measure(function):
+    # Timed without tracemalloc, which would otherwise dominate the numbers
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, len(result)
+
+def main():
+    database = Database(':memory:', 'knownEntries', 'unknownEntries')
+    database.createTables()
+    populate(database)
+    table = Table(database.getUnknownTableName(), 0, database.getCursor(), database.getConnection())
+
+    def fullReadDict():
+        database.getConnection().row_factory = dictFactory
+        try:
+            return database.getConnection().execute('SELECT * FROM unknownEntries').fetchall()
+        finally:
+            database.getConnection().row_factory = sqlite3.Row
+
+    def macListDict(): # the former getAllList: every column of every row, then one picked out
+        return [entry['mac'] for entry in fullReadDict()]
+
+    cases = [
+        ('full read, dict_factory', fullReadDict),
+        ('full read, sqlite3.Row', table.getAllEntry),
+        ('streamed, sqlite3.Row', lambda: [entry['mac'] for entry in table.iterEntries()]),
+        ('mac list, dict_factory', macListDict),
+        ('mac list, projected', lambda: table.getAllList('mac')),
+    ]
+
+    print(f"{'case':>26} {'seconds':>10} {'peak MiB':>10} {'rows':>8}")
+    for name, function in cases:
+        elapsed, peak, rows = measure(function)
+        print(f'{name:>26} {elapsed:>10.4f} {peak / 2 ** 20:>10.2f} {rows:>8}')
+
+if __name__ == '__main__':
+    main()
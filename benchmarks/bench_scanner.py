@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from arpscanner import ArpScanner, FakeTransport
+
+NETWORKS = ['10.0.0.0/24', '10.0.0.0/20', '10.0.0.0/16']
+
+def buildHosts(network, every=3):
+    prefix = int(network.split('/')[1])
+    hostCount = 2 ** (32 - prefix) - 2
+
+    hosts = {}
+    for n in range(2, hostCount, every):
+        hosts[f'10.0.{n >> 8}.{n & 0xff}'] = f'02:00:00:00:{(n >> 8) & 0xff:02x}:{n & 0xff:02x}'
+    return hosts
+
+def main():
+    print(f"{'network':>14} {'targets':>8} {'replies':>8} {'seconds':>10}")
+
+    for network in NETWORKS:
+        transport = FakeTransport(buildHosts(network), network=network, ip='10.0.0.1')
+        scanner = ArpScanner(transport, rate=0, retries=1, timeout=0.05)
+
+        start = time.perf_counter()
+        result = scanner.scan()
+        elapsed = time.perf_counter() - start
+
+        print(f'{network:>14} {transport.network().num_addresses - 2:>8} {len(result):>8} {elapsed:>10.4f}')
+        transport.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+ROUNDS = 20
+COMMANDS = [['-h'], ['-s'], ['-s', 'known']]
+
+def timeCommand(directory, args): # -> [seconds] of full interpreter runs, cold start included
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(directory, 'mainlite.py')] + args,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)
+
+def main():
+    # bench_startup.py [results.json]
+    outputPath = sys.argv[1] if len(sys.argv) > 1 else None
+    results = []
+
+    # A copy of the sources, so arp.db is created in a throwaway directory
+    with tempfile.TemporaryDirectory() as directory:
+        for path in glob.glob(os.path.join(ROOT, '*.py')):
+            shutil.copy(path, directory)
+
+        # The first run creates the schema and is not timed
+        subprocess.run([sys.executable, os.path.join(directory, 'mainlite.py'), '-s'],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+        print(f"{'command':>12} {'best s':>10} {'median s':>10}")
+        for args in COMMANDS:
+            timings = timeCommand(directory, args)
+            results.append({'command': ' '.join(args), 'rounds': ROUNDS, 'best': timings[0], 'median': timings[len(timings) // 2]})
+            print(f"{' '.join(args):>12} {timings[0]:>10.4f} {timings[len(timings) // 2]:>10.4f}")
+
+    if outputPath:
+        with open(outputPath, 'w') as outputFile:
+            json.dump({'benchmark': 'startup', 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'python': sys.version.split()[0], 'results': results}, outputFile, indent=2)
+        print(f'Wrote {outputPath}')
+
+if __name__ == '__main__':
+    main()
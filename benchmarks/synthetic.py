@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import arpparser
+from addresses import MacAddress, IPv4Address
+from mainlite import Database
+
+SIZES = [100, 10000, 100000]
+
+def syntheticMac(n):
+    return ':'.join(f'{(n >> shift) & 0xff:02x}' for shift in (40, 32, 24, 16, 8, 0))
+
+def syntheticIp(n):
+    return f'10.{(n >> 16) & 0xff}.{(n >> 8) & 0xff}.{n & 0xff}'
+
+def onlineHosts(size): # -> [(ip, mac)] answering a scan of a network with 'size' devices
+    # Half the devices answer, and every other known device (n % 8 == 0) came back on a new ip
+    return [(syntheticIp(n + 1 if n % 8 == 0 else n), syntheticMac(n)) for n in range(0, size, 2)]
+
+def syntheticCapture(size): # -> bytes shaped like `arp-scan -q -l` output
+    hosts = onlineHosts(size)
+    header = (f'Interface: eth0, type: EN10MB, MAC: 02:00:00:00:00:01, IPv4: 10.0.0.1\n'
+              f'Starting arp-scan 1.10.0 with {size} hosts (https://github.com/royhills/arp-scan)\n')
+    lines = ''.join(f'{ip}\t{mac}\n' for ip, mac in hosts)
+    footer = (f'\n{len(hosts)} packets received by filter, 0 packets dropped by kernel\n'
+              f'Ending arp-scan 1.10.0: {size} hosts scanned in 1.912 seconds ({size / 1.912:.2f} hosts/sec). {len(hosts)} responded\n')
+    return (header + lines + footer).encode()
+
+def populateDatabase(path, size, profile=None): # -> Database
+    # A quarter of the devices are known, another quarter are already in the unknown table
+    database = Database(path, 'knownEntries', 'unknownEntries', profile)
+    database.createTables()
+
+    with database.getConnection().transaction():
+        database.getCursor().executemany(
+            'INSERT INTO knownEntries (name, mac, ip, time) VALUES (?, ?, ?, ?)',
+            [(f'device{n}', MacAddress.fromString(syntheticMac(n)), IPv4Address.fromString(syntheticIp(n)),
+              '2024-01-01 00:00:00') for n in range(0, size, 4)])
+        database.getCursor().executemany(
+            'INSERT INTO unknownEntries (ip, mac, time) VALUES (?, ?, ?)',
+            [(IPv4Address.fromString(syntheticIp(n)), MacAddress.fromString(syntheticMac(n)),
+              '2024-01-01 00:00:00') for n in range(1, size, 4)])
+
+    return database
+
+class FakeNetworker:
+    # Stands in for Networker by replaying a captured arp-scan output, timing the read and the parse separately
+    def __init__(self, capturePath):
+        self.capturePath = capturePath
+        self.fresh = False
+        self.timings = {'scan': 0.0, 'parse': 0.0}
+
+    def getArp(self):
+        start = time.perf_counter()
+        with open(self.capturePath, 'rb') as capture:
+            output = capture.read()
+        parsed = time.perf_counter()
+
+        arpResult = arpparser.parse(output)
+        for arpDict in arpResult:
+            arpDict['interface'] = 'eth0'
+
+        self.timings['scan'] += parsed - start
+        self.timings['parse'] += time.perf_counter() - parsed
+        return arpResult
+
+    def getUncachedArp(self):
+        return self.getArp()
+
+    def getTargets(self):
+        return [{'interface': 'eth0', 'cidr': None}]
+
+def generate(directory, sizes=SIZES) -> None:
+    os.makedirs(directory, exist_ok=True)
+
+    for size in sizes:
+        with open(os.path.join(directory, f'capture-{size}.txt'), 'wb') as capture:
+            capture.write(syntheticCapture(size))
+
+        databasePath = os.path.join(directory, f'arp-{size}.db')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(databasePath + suffix):
+                os.remove(databasePath + suffix)
+        populateDatabase(databasePath, size).getConnection().close()
+
+        print(f'Generated {size} devices in {directory}')
+
+if __name__ == '__main__':
+    generate(sys.argv[1] if len(sys.argv) > 1 else 'synthetic')
@@ -0,0 +1,101 @@
+import json
+import os
+import socket
+import sys
+
+# Thin client for a running `arpmanager serve`. It only imports the standard library pieces it
+# needs, so a poll costs an interpreter start and one round trip rather than a full CLI startup.
+
+DEFAULT_SOCKET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'arpmanager.sock')
+
+USAGE = """Usage: arpmanager query [--socket PATH] [OPERATION] [OPTIONS]
+
+Operations:
+    ping
+    select [known|unknown]
+    lookup [known|unknown] [column] [value]
+    insert [known|unknown] [name|ip] [mac]
+    delete [known|unknown] [column] [value]
+    update [--fresh]
+
+Results are printed as JSON. The socket defaults to $ARPMANAGER_SOCKET or arpmanager.sock next to this script."""
+
+class QueryClient:
+    def __init__(self, socketPath=None, timeout=30):
+        self.socketPath = socketPath or os.environ.get('ARPMANAGER_SOCKET') or DEFAULT_SOCKET
+        self.timeout = timeout
+        self.connection = None
+        self.reader = None
+
+    def request(self, op, **params): # -> result, raises RuntimeError with the server's error
+        # One connection is kept open, so repeated requests from a poller skip the connect
+        if self.connection is None:
+            self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.connection.settimeout(self.timeout)
+            self.connection.connect(self.socketPath)
+            self.reader = self.connection.makefile('rb')
+
+        self.connection.sendall(json.dumps(dict(params, op=op), separators=(',', ':')).encode() + b'\n')
+        line = self.reader.readline()
+        if not line:
+            self.close()
+            raise ConnectionError('Server closed the connection')
+
+        response = json.loads(line)
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.reader.close()
+            self.connection.close()
+            self.connection = None
+            self.reader = None
+
+def buildRequest(args): # ['select', 'known'] -> ('select', {'table': 'known'}) | None
+    if not args:
+        return None
+
+    op, args = args[0], args[1:]
+    if op == 'ping' and not args:
+        return op, {}
+    if op == 'select' and len(args) == 1:
+        return op, {'table': args[0]}
+    if op in ('lookup', 'delete') and len(args) == 3:
+        return op, {'table': args[0], 'column': args[1], 'value': args[2]}
+    if op == 'insert' and len(args) == 3:
+        return op, {'table': args[0], 'nameIp': args[1], 'mac': args[2]}
+    if op == 'update' and args in ([], ['--fresh']):
+        return op, {'fresh': bool(args)}
+    return None
+
+def main():
+    args = sys.argv[1:]
+    socketPath = None
+    if args[:1] == ['--socket'] and len(args) > 1:
+        socketPath, args = args[1], args[2:]
+
+    request = buildRequest(args)
+    if request is None:
+        print(USAGE)
+        return 1
+
+    client = QueryClient(socketPath)
+    try:
+        print(json.dumps(client.request(request[0], **request[1])))
+        return 0
+
+    except OSError as e:
+        print(f'Cannot reach arpmanager server at {client.socketPath}: {e}', file=sys.stderr)
+        return 1
+
+    except RuntimeError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+
+    finally:
+        client.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
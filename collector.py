@@ -0,0 +1,300 @@
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import re
+import signal
+import socket
+import sqlite3
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from addresses import adapt, canonicalMac, registerSqliteTypes, MAC_TYPE, IPV4_TYPE
+
+# Multi-site aggregation. Scanner nodes push the change events of each committed scan, zlib
+# compressed, to a central aggregator, which keeps one SQLite shard per site and answers
+# "where is MAC X" by querying every shard in parallel.
+#
+# Frames on the wire are a 4-byte big-endian length followed by zlib-compressed JSON; every
+# request frame gets exactly one response frame. The aggregator listens on loopback unless a shared
+# 'collector.token' is set, which every request then has to carry.
+
+FRAME_LENGTH = struct.Struct('>I')
+MAX_FRAME = 64 * 1024 * 1024
+SITE_NAME = re.compile(r'[A-Za-z0-9_.-]{1,64}')
+
+def encodeFrame(message): # -> bytes
+    body = zlib.compress(json.dumps(message, separators=(',', ':')).encode())
+    return FRAME_LENGTH.pack(len(body)) + body
+
+def decodeFrame(body): # -> message
+    # MAX_FRAME bounds the decompressed size too, so a small frame cannot inflate into gigabytes
+    decompressor = zlib.decompressobj()
+    payload = decompressor.decompress(body, MAX_FRAME)
+    if decompressor.unconsumed_tail:
+        raise ValueError(f'Frame decompresses to more than {MAX_FRAME} bytes')
+    return json.loads(payload)
+
+def isLoopback(host) -> bool:
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def parseAddress(address): # 'host:port' -> (host, port)
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+class CollectorClient:
+    def __init__(self, address, timeout=5, token=None):
+        self.address = parseAddress(address)
+        self.timeout = timeout
+        self.token = token
+
+    def request(self, message): # -> response, raises OSError when the aggregator cannot be reached
+        if self.token:
+            message = dict(message, token=self.token)
+
+        with socket.create_connection(self.address, self.timeout) as connection:
+            connection.sendall(encodeFrame(message))
+            reader = connection.makefile('rb')
+            header = reader.read(FRAME_LENGTH.size)
+            if len(header) < FRAME_LENGTH.size:
+                raise ConnectionError('Aggregator closed the connection')
+            length, = FRAME_LENGTH.unpack(header)
+            response = decodeFrame(reader.read(length))
+
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+class DeltaPusher:
+    # Node side. Pushes are synchronous with a short timeout. Every batch is first queued in arp.db
+    # (up to 'backlog' of them) and only removed once the aggregator has taken it, so batches a
+    # failed push left behind are sent ahead of the next scan's, even from a later invocation.
+    def __init__(self, collectorConfig, connection):
+        self.client = CollectorClient(collectorConfig['address'], collectorConfig['timeout'], collectorConfig['token'])
+        self.site = collectorConfig['site'] or socket.gethostname()
+        self.backlog = collectorConfig['backlog']
+        self.connection = connection
+
+    def push(self, events) -> None:
+        with self.connection.transaction():
+            if events:
+                self.connection.execute('INSERT INTO collectorBacklog (batch) VALUES (?)',
+                                        (json.dumps([event.toDict() for event in events], separators=(',', ':')),))
+                self.connection.execute('''DELETE FROM collectorBacklog WHERE id NOT IN
+                    (SELECT id FROM collectorBacklog ORDER BY id DESC LIMIT ?)''', (self.backlog,))
+
+            pending = self.connection.execute('SELECT id, batch FROM collectorBacklog ORDER BY id').fetchall()
+
+        if not pending:
+            return
+
+        try:
+            self.client.request({'op': 'push', 'site': self.site, 'batches': [json.loads(entry['batch']) for entry in pending]})
+        except (OSError, RuntimeError) as e:
+            print(f'Error when pushing to aggregator @DeltaPusher: {e}, {len(pending)} batches kept', file=sys.stderr)
+            return
+
+        with self.connection.transaction():
+            self.connection.execute('DELETE FROM collectorBacklog WHERE id <= ?', (pending[-1]['id'],))
+
+    def pushSnapshot(self, knownTable, unknownTable): # -> hosts sent
+        # Whole tables, for a node joining an aggregator that has none of its earlier deltas.
+        # A MAC in both tables is sent once, as its known entry.
+        hosts = {entry['mac']: {'mac': entry['mac'], 'ip': entry['ip'], 'name': entry['name']} for entry in knownTable.iterEntries()}
+        for entry in unknownTable.iterEntries():
+            hosts.setdefault(entry['mac'], {'mac': entry['mac'], 'ip': entry['ip'], 'name': None})
+
+        self.client.request({'op': 'snapshot', 'site': self.site, 'time': time.time(), 'hosts': list(hosts.values())})
+
+        # The snapshot supersedes every queued delta
+        with self.connection.transaction():
+            self.connection.execute('DELETE FROM collectorBacklog')
+
+        return len(hosts)
+
+class Shard:
+    # One site's hosts, in their own SQLite file so sites never contend for the same write lock
+    def __init__(self, path):
+        self.path = path
+        self.connection = Shard.connect(path)
+        self.connection.execute(f'''CREATE TABLE IF NOT EXISTS hosts (
+            mac {MAC_TYPE} PRIMARY KEY,
+            ip {IPV4_TYPE},
+            name TEXT,
+            state TEXT NOT NULL,
+            lastChange REAL NOT NULL
+        )''')
+        self.connection.commit()
+
+    @staticmethod
+    def connect(path):
+        connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        return connection
+
+    def applyEvents(self, events) -> None:
+        online = [(adapt('mac', event['mac']), adapt('ip', event['ip']), event['name'], event['time'])
+                  for event in events if event['kind'] != 'known-offline']
+        offline = [(event['time'], adapt('mac', event['mac'])) for event in events if event['kind'] == 'known-offline']
+
+        # Events of one batch are in scan order, so applying them in order leaves the latest state
+        with self.connection:
+            self.connection.executemany('''INSERT INTO hosts (mac, ip, name, state, lastChange) VALUES (?, ?, ?, 'online', ?)
+                ON CONFLICT(mac) DO UPDATE SET ip=excluded.ip, name=coalesce(excluded.name, name),
+                    state='online', lastChange=excluded.lastChange''', online)
+            self.connection.executemany("UPDATE hosts SET state='offline', lastChange=? WHERE mac=?", offline)
+
+    def applySnapshot(self, hosts, seen) -> None:
+        with self.connection:
+            self.connection.execute('DELETE FROM hosts')
+            # Hosts are unique per MAC from pushSnapshot; should one repeat, the first (known) entry is kept
+            self.connection.executemany('INSERT OR IGNORE INTO hosts (mac, ip, name, state, lastChange) VALUES (?, ?, ?, ?, ?)',
+                [(adapt('mac', host['mac']), adapt('ip', host['ip']), host['name'],
+                  'online' if host['ip'] else 'offline', seen) for host in hosts])
+
+    def close(self) -> None:
+        self.connection.close()
+
+class Aggregator:
+    def __init__(self, directory, address, workers=8, token=None):
+        self.directory = directory
+        self.address = parseAddress(address)
+        self.token = token
+
+        # Anyone who can connect may write any site's shard, so only loopback goes without a token
+        if not token and not isLoopback(self.address[0]):
+            raise ValueError(f"Listening on {self.address[0]} needs 'collector.token'")
+
+        self.shards = {} # site -> Shard, opened on first push
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shard')
+        self.stopping = None
+
+        registerSqliteTypes()
+        os.makedirs(directory, exist_ok=True)
+
+    def getShardPath(self, site):
+        if not SITE_NAME.fullmatch(site or ''):
+            raise ValueError(f'Invalid site name: {site}')
+        return os.path.join(self.directory, f'{site}.db')
+
+    def getShard(self, site):
+        if site not in self.shards:
+            self.shards[site] = Shard(self.getShardPath(site))
+        return self.shards[site]
+
+    def getSites(self): # -> ['site', ...] with a shard on disk
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith('.db'))
+
+    def run(self) -> None:
+        asyncio.run(self.runAsync())
+
+    async def runAsync(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+
+        for signalNumber in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signalNumber, self.stopping.set)
+
+        server = await asyncio.start_server(self.__handle, *self.address)
+        print(f'Aggregating into {self.directory} on {self.address[0]}:{self.address[1]}')
+
+        try:
+            await self.stopping.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            self.executor.shutdown()
+            for shard in self.shards.values():
+                shard.close()
+
+    async def __handle(self, reader, writer) -> None:
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(FRAME_LENGTH.size)
+                except asyncio.IncompleteReadError:
+                    break
+
+                length, = FRAME_LENGTH.unpack(header)
+                if length > MAX_FRAME:
+                    break
+
+                response = await self.answer(await reader.readexactly(length))
+                writer.write(encodeFrame(response))
+                await writer.drain()
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def answer(self, body): # -> {'ok': True, 'result': x} | {'ok': False, 'error': x}
+        try:
+            message = decodeFrame(body)
+            if not isinstance(message, dict):
+                raise ValueError('Request must be a JSON object')
+
+            if self.token and not hmac.compare_digest(str(message.get('token', '')).encode(), self.token.encode()):
+                return {'ok': False, 'error': 'Invalid token'}
+
+            op = message.get('op')
+
+            # Writes run on the loop thread, one at a time, through each site's own connection
+            if op == 'push':
+                shard = self.getShard(message['site'])
+                for batch in message['batches']:
+                    shard.applyEvents(batch)
+                return {'ok': True, 'result': sum(len(batch) for batch in message['batches'])}
+
+            if op == 'snapshot':
+                self.getShard(message['site']).applySnapshot(message['hosts'], message.get('time') or time.time())
+                return {'ok': True, 'result': len(message['hosts'])}
+
+            if op == 'where':
+                return {'ok': True, 'result': await self.where(message['mac'])}
+
+            if op == 'sites':
+                return {'ok': True, 'result': self.getSites()}
+
+            raise ValueError(f'Unknown op: {op}')
+
+        except (ValueError, KeyError, TypeError, zlib.error) as e:
+            return {'ok': False, 'error': str(e)}
+
+        except Exception as e:
+            print(f'Error when answering @Aggregator: {e}', file=sys.stderr)
+            return {'ok': False, 'error': 'Internal error'}
+
+    async def where(self, mac): # -> [{'site': x, 'mac': x, 'ip': x, ...}] most recent first
+        mac = adapt('mac', canonicalMac(mac))
+        loop = asyncio.get_running_loop()
+
+        # Every shard is read on its own pool thread with its own connection, so the fan-out runs in parallel
+        results = await asyncio.gather(*(loop.run_in_executor(self.executor, Aggregator.lookupShard, self.getShardPath(site), site, mac)
+                                         for site in self.getSites()))
+
+        return sorted((host for host in results if host is not None), key=lambda host: host['lastChange'], reverse=True)
+
+    @staticmethod
+    def lookupShard(path, site, mac): # -> {'site': x, ...} | None
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True, detect_types=sqlite3.PARSE_DECLTYPES)
+        connection.row_factory = sqlite3.Row
+        try:
+            entry = connection.execute('SELECT mac, ip, name, state, lastChange FROM hosts WHERE mac=?', (mac,)).fetchone()
+            return dict(entry, site=site) if entry is not None else None
+        except sqlite3.OperationalError:
+            return None
+        finally:
+            connection.close()
@@ -1,4 +1,9 @@
+import json
+import os
+import sqlite3
 import sys
+import metrics
+from output import WRITERS
 
 class Command:
     def execute(self):
@@ -27,18 +32,44 @@ Commands:
     {2}
     {3}
     {4}
+    {5}
+    {6}
+    {7}
+    {8}
+    {9}
+    {10}
+    {11}
 
 Examples:
     python script.py -s known       # Display entries from the 'known' table.
+    python script.py -s known --format jsonl --where mac=00:1A:2B:3C:4D:5E  # One known entry as a JSON line.
+    python script.py -s unknown --limit 100 --after 2400  # The next page of 100 unknown entries after id 2400.
     python script.py -u unknown     # Update the 'unknown' table based on ARP scan.
     python script.py -i known 'Device1' '00:1A:2B:3C:4D:5E'  # Insert a known entry with name and MAC.
     python script.py -d unknown ip '192.168.1.100'  # Delete an unknown entry based on IP address.
     python script.py -uc known mac '00:1A:2B:3C:4D:5E' ip '192.168.1.101' # Updates the 'ip' column in the 'known' table where 'mac' matches '00:1A:2B:3C:4D:5E'.
+    python script.py --daemon       # Listen for ARP traffic and keep both tables up to date.
+    python script.py -u --fresh     # Update both tables from a new scan, ignoring cached scan results.
+    python script.py -hist '00:1A:2B:3C:4D:5E' 48  # Show when the MAC was online and which IPs it held in the last 48 hours.
+    python script.py import known assets.csv --policy merge  # Load an asset register in one transaction.
+    python script.py export unknown unknown.parquet  # Write the unknown table to Parquet (needs pyarrow).
+    python script.py oui '00:1A:2B:3C:4D:5E'  # Show the vendor the MAC's OUI is registered to.
+    python script.py serve          # Keep the database and scanner warm and answer queries on a Unix socket.
+    arpmanager query lookup known mac '00:1A:2B:3C:4D:5E'  # Ask a running server, printing the entry as JSON.
+    python script.py collect        # Run the aggregator that scanner nodes with 'collector.address' push their scans to.
+    python script.py where '00:1A:2B:3C:4D:5E'  # Ask the aggregator which sites have seen the MAC, most recent first.
+    python script.py -u --profile=update.prof  # Update both tables, print a per-stage time breakdown and dump cProfile stats.
 
 Notes:
     - The ARP scan is used to update the IP addresses for known MAC addresses.
     - The program works with a SQLite database, meaning the changes are saved persistently.
-""".format(HelpCommand.getSelect(), HelpCommand.getUpdate(), HelpCommand.getInsert(), HelpCommand.getDelete(), HelpCommand.getUpdateColumn()))
+    - Scan results are shared between invocations for 'scanCache.ttl' seconds; add --fresh to any command to force a new scan.
+    - Add --profile to any command to print time spent per stage (scan, parse, load, reconcile, write, expire, history, commit)
+      and row and SQL statement counts to stderr; --profile=FILE also writes cProfile stats to FILE.
+      'parse' runs inside 'scan' and 'load' inside 'reconcile'. In daemon mode set 'metrics.textfile' or 'metrics.port'
+      to export the same figures in the Prometheus text format.
+""".format(HelpCommand.getSelect(), HelpCommand.getUpdate(), HelpCommand.getInsert(), HelpCommand.getDelete(), HelpCommand.getUpdateColumn(), HelpCommand.getDaemon(), HelpCommand.getHistory(), HelpCommand.getServe(),
+           HelpCommand.getImport(), HelpCommand.getExport(), HelpCommand.getOui(), HelpCommand.getCollect()))
 
     @staticmethod
     def getInsert():
@@ -57,49 +88,160 @@ Notes:
 
     @staticmethod
     def getSelect():
-        return """-s [known|unknown]    Show all entries from the specified table (known or unknown)."""
+        return """-s [known|unknown] [--format table|csv|jsonl|ndjson|json] [--columns c1,c2] [--where column=value]
+        [--limit N] [--offset N] [--after ID]
+        Show entries from the specified table (known or unknown), or both. Rows are streamed as they are read.
+        For both tables json is one object keyed by table name, and csv needs a table.
+        --where may be repeated and is applied in SQL; --after ID returns rows with a higher id, the cheap way to page."""
     
     @staticmethod
     def getUpdateColumn():
         return """-uc [known|unknown] [whereColumn] [whereValue] [column] [value]    Update a specific column in the specified table (known or unknown)."""
 
+    @staticmethod
+    def getDaemon():
+        return """--daemon    Passively listen for ARP requests, replies and gratuitous ARP and update both tables incrementally.
+        An active sweep still runs every 'sweepInterval' seconds for silent hosts."""
+
+
+    @staticmethod
+    def getHistory():
+        return """-hist [mac] [hours]    Show when a MAC address was online and which IPs it held (default: all retained history)."""
+
+    @staticmethod
+    def getImport():
+        return """import [known|unknown] [file] [--format csv|jsonl|parquet|arrow] [--policy skip|replace|merge]
+        Bulk load entries with a header or keys of mac and name (known) or ip (unknown), optionally ip and time.
+        On an existing MAC: skip keeps it (default), replace overwrites it, merge only fills in non-empty values."""
+
+    @staticmethod
+    def getExport():
+        return """export [known|unknown] [file|-] [--format csv|jsonl|parquet|arrow] [--columns c1,c2] [--where column=value]
+        Stream a table to a file, or JSON lines to stdout with '-'. The format follows the file extension."""
+
+    @staticmethod
+    def getOui():
+        return """oui [mac ...] | oui build [source ...]    Look up MAC vendors, or rebuild the OUI index from IEEE files.
+        When an index is found, -ni and the unknown table in -s's table format show a vendor column;
+        other formats include it with --columns ...,vendor. The index is refreshed from newer sources when its directory is writable."""
+
+    @staticmethod
+    def getServe():
+        return """serve    Answer select, lookup, insert, delete and update requests as JSON lines on a Unix socket ('server.socket').
+        Use 'arpmanager query' as the client."""
+
+    @staticmethod
+    def getCollect():
+        return """collect | where [mac ...] | push    Multi-site mode. 'collect' runs the aggregator on 'collector.listen', keeping
+        one SQLite shard per site in 'collector.directory'. Nodes with 'collector.address' set push every committed
+        scan's changes to it; 'push' sends the node's whole tables once. 'where' asks every shard for the MACs.
+        Without 'collector.token' the aggregator only listens on loopback; with it, every request must carry the token."""
+
 
 class UpdateCommand(Command):
-    def __init__(self, knownTable, unknownTable, networker, TableUpdater):
-        self.tableUpdater = TableUpdater(knownTable, unknownTable, networker)
+    def __init__(self, knownTable, unknownTable, networker, TableUpdater, config):
+        self.tableUpdater = TableUpdater(knownTable, unknownTable, networker, config)
 
     def execute(self, args=None):
-        self.tableUpdater.deleteOldUnknownEntry()
+        try:
+            if not args:
+                self.tableUpdater.update(expire=True)
+                return 1
 
-        if not args:
-            self.tableUpdater.updateKnownEntry()
-            self.tableUpdater.updateUnknownEntry()
-            return 1
+            elif args[0] == 'known':
+                self.tableUpdater.updateKnownEntry(expire=True)
+            elif args[0] == 'unknown':
+                self.tableUpdater.updateUnknownEntry(expire=True)
 
-        elif args[0] == 'known':
-            self.tableUpdater.updateKnownEntry()
-        elif args[0] == 'unknown':
-            self.tableUpdater.updateUnknownEntry()
+            else:
+                print(HelpCommand.getUpdate())
+                print(f'Invalid table: {args[0]}')
 
-        else:
-            print(HelpCommand.getUpdate())
-            print(f'Invalid table: {args[0]}')
+        except (sqlite3.Error, OSError) as e:
+            # A failed scan leaves the tables untouched; a failed write rolls the scan's transaction back
+            print(f'Error when updating tables: {e}')
+            return 0
+
+        finally:
+            # Delivers any queued change events before the process exits
+            self.tableUpdater.close()
 
 class SelectCommand(Command):
-    def __init__(self, knownTable, unknownTable):
+    def __init__(self, knownTable, unknownTable, loadIndex=None):
         self.knownTable = knownTable
         self.unknownTable = unknownTable
+        self.loadIndex = loadIndex
+
+    def getOuiIndex(self, table, options, format): # -> OuiIndex | None
+        # The index is only mapped when vendor is rendered: asked for through --columns, or the
+        # unknown table's default columns in table format
+        columns = options.get('columns')
+        vendor = 'vendor' in columns if columns is not None else format == 'table' and not table.isKnownTable
+        return self.loadIndex() if vendor and self.loadIndex is not None else None
+
+    @staticmethod
+    def parseOptions(args): # ['--limit', '10', ...] -> {'limit': 10, ...}
+        options = {'where': []}
+        values = iter(args)
+
+        for option in values:
+            value = next(values, None)
+            if value is None:
+                raise ValueError(f'{option} needs a value')
+
+            if option == '--format':
+                options['format'] = value
+            elif option == '--columns':
+                options['columns'] = value.split(',')
+            elif option == '--where':
+                column, separator, whereValue = value.partition('=')
+                if not separator:
+                    raise ValueError(f'--where expects column=value, got {value}')
+                options['where'].append((column, whereValue))
+            elif option in ('--limit', '--offset', '--after'):
+                options['afterId' if option == '--after' else option[2:]] = int(value)
+            else:
+                raise ValueError(f'Unknown option: {option}')
+
+        return options
 
     def execute(self, args=None):
-        if not args:
-            self.unknownTable.select()
-            self.knownTable.select()
-            return 1
+        args = args or []
+        tables = [('unknown', self.unknownTable), ('known', self.knownTable)]
 
-        table = Command.getCommandTable(args[0], HelpCommand.getSelect, self)
+        if args and not args[0].startswith('--'):
+            table = Command.getCommandTable(args[0], HelpCommand.getSelect, self)
+            if not table:
+                return 0
+            tables, args = [(args[0], table)], args[1:]
 
-        if table:
-            table.select()
+        try:
+            options = SelectCommand.parseOptions(args)
+            format = options.get('format', 'table')
+            if format not in WRITERS:
+                raise ValueError(f'Unknown format: {format}')
+
+            # Both tables in one output must still parse: json becomes one object keyed by table, and
+            # csv, which has a single header, needs a table. JSON lines are valid concatenated.
+            if len(tables) > 1 and format == 'csv':
+                raise ValueError('--format csv needs a table, known or unknown')
+
+            if len(tables) > 1 and format == 'json':
+                for index, (name, table) in enumerate(tables):
+                    sys.stdout.write(('{' if not index else ',') + json.dumps(name) + ':')
+                    table.select(**options, ouiIndex=self.getOuiIndex(table, options, format))
+                sys.stdout.write('}\n')
+                return 1
+
+            for _, table in tables:
+                table.select(**options, ouiIndex=self.getOuiIndex(table, options, format))
+
+        except (ValueError, KeyError) as e:
+            print(HelpCommand.getSelect())
+            print(f'Invalid options: {e}')
+            return 0
+
+        return 1
 
 class DeleteCommand(Command):
     def __init__(self, knownTable, unknownTable):
@@ -179,31 +321,371 @@ class NetworkInfoCommand(Command):
     def execute(self):
         self.networkInfo.getNotDatabaseEntry()
 
-class CommandDispatcher:
-    def __init__(self, database, Table, Networker, TableUpdater, NetworkInfo):
-        self.knownTable = Table(database.getKnownTableName(), 1, database.getCursor(), database.getConnection())
-        self.unknownTable = Table(database.getUnknownTableName(), 0, database.getCursor(), database.getConnection())
+class DaemonCommand(Command):
+    def __init__(self, knownTable, unknownTable, networker, TableUpdater, config):
+        self.tableUpdater = TableUpdater(knownTable, unknownTable, networker, config)
+        self.networker = networker
+        self.config = config
 
-        self.networker = Networker()
-        self.networkInfo = NetworkInfo(self.knownTable, self.unknownTable)
+    def execute(self, args=None):
+        from daemon import PresenceDaemon
+
+        interfaces = self.config.get('daemon', 'interfaces')
+        if not interfaces:
+            interfaces = sorted({target.get('interface') for target in self.networker.getTargets()}, key=str)
+
+        metricsConfig = self.config.get('metrics')
+        if metricsConfig['textfile'] or metricsConfig['port']:
+            metrics.enable()
+            metrics.traceStatements(self.tableUpdater.knownEntry.connection)
+
+        presenceDaemon = PresenceDaemon(
+            self.tableUpdater,
+            self.networker,
+            interfaces,
+            self.config.get('daemon', 'flushInterval'),
+            self.config.get('daemon', 'sweepInterval'),
+            metricsFile=metricsConfig['textfile'],
+            metricsPort=metricsConfig['port'])
+        presenceDaemon.run()
+
+class HistoryCommand(Command):
+    def __init__(self, database, config):
+        self.database = database
+        self.config = config
+
+    def execute(self, args=None):
+        if not args or len(args) > 2:
+            print(HelpCommand.getHistory())
+            print('Invalid args')
+            return 0
+
+        from datetime import datetime
+        from tabulate import tabulate
+        from history import PresenceHistory
+        import time
+
+        try:
+            since = time.time() - float(args[1]) * 3600 if len(args) == 2 else 0
+            history = PresenceHistory(self.database.getConnection(), self.config.get('history'))
+            presence = history.getPresence(args[0], int(since))
+            ips = history.getIps(args[0], int(since))
+        except ValueError as e:
+            print(HelpCommand.getHistory())
+            print(f'Invalid options: {e}')
+            return 0
+
+        formatTime = lambda seen: datetime.fromtimestamp(seen).strftime('%Y-%m-%d %H:%M:%S')
+
+        print(tabulate([(formatTime(interval['start']), formatTime(interval['end']), interval['ip'], interval['resolution'])
+                        for interval in presence], headers=('online from', 'until', 'ip', 'resolution')))
+        print()
+        print(tabulate([(ip['ip'], formatTime(ip['firstSeen']), formatTime(ip['lastSeen']), ip['samples']) for ip in ips],
+                       headers=('ip', 'first seen', 'last seen', 'samples')))
+
+class OuiCommand(Command):
+    def __init__(self, ouiConfig, indexPath, loadIndex):
+        self.ouiConfig = ouiConfig
+        self.indexPath = indexPath
+        self.loadIndex = loadIndex
+
+    def execute(self, args=None):
+        if not args:
+            print(HelpCommand.getOui())
+            print('Invalid args')
+            return 0
+
+        import oui
+
+        if args[0] == 'build':
+            sources = args[1:] or oui.findSources(self.ouiConfig)
+            if not sources:
+                print(f'No OUI source found in {", ".join(oui.DEFAULT_SOURCES)}')
+                return 0
+            try:
+                print(f'Indexed {oui.build(sources, self.indexPath)} prefixes into {self.indexPath}')
+            except OSError as e:
+                print(f'Error when building OUI index: {e}')
+                return 0
+            return 1
+
+        ouiIndex = self.loadIndex()
+        if ouiIndex is None:
+            print("No OUI index, run 'oui build [source]' or set 'oui.sources'")
+            return 0
+
+        for mac in args:
+            print(f'{mac}  {ouiIndex.lookup(mac) or "unknown vendor"}')
+        return 1
+
+class ImportCommand(Command):
+    def __init__(self, knownTable, unknownTable):
+        self.knownTable = knownTable
+        self.unknownTable = unknownTable
+
+    def execute(self, args=None):
+        if not args or len(args) < 2:
+            print(HelpCommand.getImport())
+            print('Invalid args')
+            return 0
+
+        table = Command.getCommandTable(args[0], HelpCommand.getImport, self)
+        if not table:
+            return 0
 
+        import time
+        import inventory
+
+        start = time.perf_counter()
+        try:
+            options = dict(zip(args[2::2], args[3::2]))
+            if len(args[2:]) % 2 or set(options) - {'--format', '--policy'}:
+                raise ValueError(f'Unknown options: {" ".join(args[2:])}')
+
+            changed, invalid = inventory.importFile(table, args[1], options.get('--format'), options.get('--policy', 'skip'))
+
+        except Exception as e:
+            print(HelpCommand.getImport())
+            print(f'Import failed, nothing was written: {e}')
+            return 0
+
+        for record, reason in invalid[:10]:
+            print(f'Skipped {record}: {reason}')
+        if len(invalid) > 10:
+            print(f'... and {len(invalid) - 10} more')
+
+        print(f'Imported {changed} rows into {args[0]} ({len(invalid)} invalid) in {time.perf_counter() - start:.2f}s')
+        return 1
+
+class ExportCommand(Command):
+    def __init__(self, knownTable, unknownTable):
+        self.knownTable = knownTable
+        self.unknownTable = unknownTable
+
+    def execute(self, args=None):
+        if not args or len(args) < 2:
+            print(HelpCommand.getExport())
+            print('Invalid args')
+            return 0
+
+        table = Command.getCommandTable(args[0], HelpCommand.getExport, self)
+        if not table:
+            return 0
+
+        import inventory
+
+        try:
+            options = SelectCommand.parseOptions(args[2:])
+            if set(options) - {'format', 'columns', 'where'}:
+                raise ValueError('export takes --format, --columns and --where')
+
+            inventory.exportFile(table, args[1], options.get('format'), options.get('columns'), options['where'])
+
+        except (OSError, ValueError, KeyError) as e:
+            print(HelpCommand.getExport(), file=sys.stderr)
+            print(f'Invalid options: {e}', file=sys.stderr)
+            return 0
+
+        return 1
+
+class ServeCommand(Command):
+    def __init__(self, knownTable, unknownTable, networker, TableUpdater, config):
+        self.tableUpdater = TableUpdater(knownTable, unknownTable, networker, config)
+        self.knownTable = knownTable
+        self.unknownTable = unknownTable
+        self.networker = networker
+        self.config = config
+
+    def execute(self, args=None):
+        from client import DEFAULT_SOCKET
+        from server import QueryServer
+
+        queryServer = QueryServer(
+            self.knownTable,
+            self.unknownTable,
+            self.tableUpdater,
+            self.networker,
+            self.config.get('server', 'socket') or DEFAULT_SOCKET)
+        queryServer.run()
+
+class CollectCommand(Command):
+    def __init__(self, collectorConfig, directory):
+        self.collectorConfig = collectorConfig
+        self.directory = directory
+
+    def execute(self, args=None):
+        from collector import Aggregator
+
+        try:
+            aggregator = Aggregator(self.directory, self.collectorConfig['listen'], self.collectorConfig['workers'],
+                                    self.collectorConfig['token'])
+            aggregator.run()
+        except (OSError, ValueError) as e:
+            print(f'Error when starting aggregator: {e}')
+            return 0
+
+        return 1
+
+class WhereCommand(Command):
+    def __init__(self, collectorConfig):
+        self.collectorConfig = collectorConfig
+
+    def execute(self, args=None):
+        if not args:
+            print(HelpCommand.getCollect())
+            print('Invalid args')
+            return 0
+
+        from datetime import datetime
+        from tabulate import tabulate
+        from collector import CollectorClient
+
+        # Nodes ask the aggregator they push to, the aggregator host asks itself
+        client = CollectorClient(self.collectorConfig['address'] or self.collectorConfig['listen'], self.collectorConfig['timeout'],
+                                 self.collectorConfig['token'])
+
+        rows = []
+        try:
+            for mac in args:
+                rows += [(host['mac'], host['site'], host['ip'], host['name'], host['state'],
+                          datetime.fromtimestamp(host['lastChange']).strftime('%Y-%m-%d %H:%M:%S'))
+                         for host in client.request({'op': 'where', 'mac': mac})]
+        except (OSError, RuntimeError) as e:
+            print(f'Error when querying aggregator: {e}')
+            return 0
+
+        print(tabulate(rows, headers=('mac', 'site', 'ip', 'name', 'state', 'last change')))
+        return 1
+
+class PushCommand(Command):
+    def __init__(self, knownTable, unknownTable, collectorConfig):
+        self.knownTable = knownTable
+        self.unknownTable = unknownTable
+        self.collectorConfig = collectorConfig
+
+    def execute(self, args=None):
+        if not self.collectorConfig['address']:
+            print(HelpCommand.getCollect())
+            print("Set 'collector.address' to the aggregator's host:port")
+            return 0
+
+        from collector import DeltaPusher
+
+        pusher = DeltaPusher(self.collectorConfig, self.knownTable.connection)
+        try:
+            print(f'Pushed {pusher.pushSnapshot(self.knownTable, self.unknownTable)} hosts as site {pusher.site}')
+        except (OSError, RuntimeError) as e:
+            print(f'Error when pushing to aggregator: {e}')
+            return 0
+
+        return 1
+
+class CommandDispatcher:
+    def __init__(self, openDatabase, config, Table, Networker, TableUpdater, NetworkInfo):
+        self.openDatabase = openDatabase
+        self.config = config
+        self.Table = Table
+        self.Networker = Networker
+
+        self.database = None
+        self.tables = None
+        self.networker = None
+        self.ouiIndex = None
+        self.fresh = False
+
+        # Only the selected command is built, together with the database, tables and Networker it asks for
         self.commands = {
-            '-h': HelpCommand(),
-            '-u': UpdateCommand(self.knownTable, self.unknownTable, self.networker, TableUpdater),
-            '-s': SelectCommand(self.knownTable, self.unknownTable),
-            '-i': InsertCommand(self.knownTable, self.unknownTable),
-            '-d': DeleteCommand(self.knownTable, self.unknownTable),
-            '-uc': UpdateColumnCommand(self.knownTable, self.unknownTable),
-            '-ni': NetworkInfoCommand(self.networkInfo),
+            '-h': lambda: HelpCommand(),
+            '-u': lambda: UpdateCommand(*self.getTables(), self.getNetworker(), TableUpdater, config),
+            '-s': lambda: SelectCommand(*self.getTables(), self.getOuiIndex),
+            '-i': lambda: InsertCommand(*self.getTables()),
+            '-d': lambda: DeleteCommand(*self.getTables()),
+            '-uc': lambda: UpdateColumnCommand(*self.getTables()),
+            '-ni': lambda: NetworkInfoCommand(NetworkInfo(*self.getTables(), self.getNetworker(), self.getOuiIndex())),
+            '-hist': lambda: HistoryCommand(self.getDatabase(), config),
+            '--daemon': lambda: DaemonCommand(*self.getTables(), self.getNetworker(), TableUpdater, config),
+            'oui': lambda: OuiCommand(config.get('oui'), self.getOuiIndexPath(), self.getOuiIndex),
+            'import': lambda: ImportCommand(*self.getTables()),
+            'export': lambda: ExportCommand(*self.getTables()),
+            'serve': lambda: ServeCommand(*self.getTables(), self.getNetworker(), TableUpdater, config),
+            'collect': lambda: CollectCommand(config.get('collector'), self.getShardDirectory()),
+            'where': lambda: WhereCommand(config.get('collector')),
+            'push': lambda: PushCommand(*self.getTables(), config.get('collector')),
         }
 
+    def getDatabase(self):
+        if self.database is None:
+            self.database = self.openDatabase()
+        return self.database
+
+    def getTables(self): # -> (knownTable, unknownTable)
+        if self.tables is None:
+            database = self.getDatabase()
+            self.tables = (self.Table(database.getKnownTableName(), 1, database.getCursor(), database.getConnection()),
+                           self.Table(database.getUnknownTableName(), 0, database.getCursor(), database.getConnection()))
+        return self.tables
+
+    def getOuiIndexPath(self):
+        # Next to arp.db unless configured
+        return self.config.get('oui', 'index') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'oui.idx')
+
+    def getShardDirectory(self):
+        # Next to arp.db unless configured
+        return self.config.get('collector', 'directory') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sites')
+
+    def getOuiIndex(self):
+        if self.ouiIndex is None:
+            import oui
+            self.ouiIndex = oui.load(self.config.get('oui'), self.getOuiIndexPath())
+        return self.ouiIndex
+
+    def getNetworker(self):
+        if self.networker is None:
+            self.networker = self.Networker(self.config, self.getDatabase().getDatabasePath())
+            self.networker.fresh = self.fresh
+        return self.networker
+
     def dispatch(self):
-        sysArgs = sys.argv
+        sysArgs = list(sys.argv)
+
+        if '--fresh' in sysArgs:
+            sysArgs.remove('--fresh')
+            self.fresh = True
+
+        profileOption = next((arg for arg in sysArgs if arg == '--profile' or arg.startswith('--profile=')), None)
+        if profileOption is not None:
+            sysArgs.remove(profileOption)
+            return self.profile(sysArgs, profileOption.partition('=')[2])
+
+        return self.run(sysArgs)
+
+    def profile(self, sysArgs, dumpPath):
+        metrics.enable()
+        metrics.traceStatements(self.getDatabase().getConnection())
+
+        profiler = None
+        if dumpPath:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        try:
+            return self.run(sysArgs)
+
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(dumpPath)
+                print(f'Wrote cProfile stats to {dumpPath}', file=sys.stderr)
+
+            print(metrics.report(), file=sys.stderr)
+
+    def run(self, sysArgs):
         if len(sysArgs) > 1:
             command = sysArgs[1]
             
             if command in self.commands:
-                commandClass = self.commands[command]
+                commandClass = self.commands[command]()
             else:
                 print(f'Unknown command: {command}')
                 return 0
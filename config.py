@@ -0,0 +1,107 @@
+import json
+import os
+
+class Config:
+    DEFAULTS = {
+        'scanner': {
+            'backend': 'arp-scan',  # arp-scan | native
+            'interface': None,      # None picks the interface of the default route
+            'targets': [],          # [{'interface': 'eth0', 'cidr': '10.0.0.0/24'}], empty scans the local network of 'interface'
+            'workers': 4,           # segments scanned concurrently
+            'rate': 1000,           # ARP requests per second (native backend)
+            'retries': 2,
+            'timeout': 0.5,         # seconds to wait for late replies after each round
+        },
+        'daemon': {
+            'interfaces': [],       # empty listens on the interfaces of the scanner targets
+            'flushInterval': 5,     # seconds between coalesced table writes
+            'sweepInterval': 900,   # seconds between active fallback sweeps, 0 disables them
+        },
+        'scanCache': {
+            'ttl': 30,              # seconds a scan result is reused by other invocations, 0 disables the cache
+            'maxEntries': 32,       # cached segments kept, least recently used go first
+        },
+        'expiry': {
+            'unknownTtl': 2 * 24 * 3600,        # seconds an unknown device may go unseen before it expires
+            'policy': 'delete',                 # delete | archive (into unknownEntriesHistory)
+            'bucket': 'day',                    # hour | day, granularity of archived rows
+            'archiveRetention': 90 * 24 * 3600, # seconds archived buckets are kept, 0 keeps them forever
+        },
+        'history': {
+            'enabled': True,
+            'rawRetention': 2 * 24 * 3600,      # seconds raw per-scan observations are kept once rolled up
+            'hourlyRetention': 30 * 24 * 3600,  # seconds hourly buckets are kept once rolled up into days
+            'dailyRetention': 365 * 24 * 3600,  # seconds daily buckets are kept, 0 keeps them forever
+        },
+        'events': {
+            'sinks': [],            # [{'type': 'stdout'}, {'type': 'unix', 'path': x}, {'type': 'webhook', 'url': x}, {'type': 'syslog'}]
+            'queueSize': 1000,      # events buffered per sink
+            'overflow': 'block',    # block | drop, what a full sink queue does to the publisher
+            'flapWindow': 600,      # seconds over which a known device's ip changes are counted, across runs (kept in arp.db)
+            'flapThreshold': 3,     # ip changes within flapWindow before a mac-flapping event
+        },
+        'gui': {
+            'refreshInterval': 0,   # seconds between automatic scans, 0 starts with auto refresh off (60s once ticked)
+        },
+        'oui': {
+            'sources': [],          # IEEE oui.txt / oui.csv / mam.csv / oui36.csv or arp-scan's ieee-oui.txt, empty tries the usual paths
+            'index': None,          # compiled index, None puts oui.idx next to arp.db; rebuilt when a source is newer and the directory is writable
+            'cacheSize': 4096,      # prefixes kept in the lookup LRU cache
+        },
+        'server': {
+            'socket': None,         # Unix socket of `arpmanager serve`, None puts arpmanager.sock next to the scripts
+        },
+        'collector': {
+            'address': None,        # host:port of the aggregator each committed scan's events are pushed to, None disables pushing
+            'site': None,           # shard this node writes to on the aggregator, None uses the hostname
+            'timeout': 2.0,         # seconds a push may take before it fails and its batch stays queued in arp.db
+            'backlog': 100,         # undelivered batches queued in arp.db and sent with the next push, oldest dropped first
+            'token': None,          # shared secret sent with every request; required for the aggregator to listen beyond loopback
+            'listen': '127.0.0.1:7420',  # aggregator mode: address `arpmanager collect` listens on
+            'directory': None,      # aggregator mode: one <site>.db shard per site, None puts them in sites/ next to arp.db
+            'workers': 8,           # aggregator mode: shards queried in parallel by 'where'
+        },
+        'metrics': {
+            'textfile': None,       # daemon mode: Prometheus text file rewritten after every flush, e.g. for node_exporter
+            'port': 0,              # daemon mode: serve /metrics on 127.0.0.1:port, 0 disables it
+        },
+        'database': {
+            'profile': 'tuned',     # tuned | default (SQLite's own settings)
+            'journalMode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmapSize': 64 * 1024 * 1024,
+            'cacheSize': -8000,     # negative values are KiB
+            'tempStore': 'MEMORY',
+            'busyTimeout': 5.0,     # seconds to wait on a locked database
+        },
+    }
+
+    def __init__(self, values=None):
+        self.values = Config.merge(Config.DEFAULTS, values or {})
+
+    @staticmethod
+    def load(path):
+        if not os.path.exists(path):
+            return Config()
+
+        try:
+            with open(path) as configFile:
+                return Config(json.load(configFile))
+
+        except (OSError, ValueError) as e:
+            print(f'Error when reading config {path}: {e}')
+            return Config()
+
+    @staticmethod
+    def merge(defaults, overrides):
+        merged = dict(defaults)
+        for key, value in overrides.items():
+            if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                merged[key] = Config.merge(merged[key], value)
+            else:
+                merged[key] = value
+        return merged
+
+    def get(self, section, key=None):
+        values = self.values.get(section, {})
+        return values if key is None else values.get(key)
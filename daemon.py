@@ -0,0 +1,168 @@
+import asyncio
+import signal
+import time
+
+import metrics
+from arpscanner import PacketTransport, parseArpFrame, macToStr
+
+UNSPECIFIED_IP = '0.0.0.0'
+
+class PresenceState:
+    def __init__(self):
+        self.hosts = {} # mac -> [ip, lastSeen]
+        self.dirty = set()
+
+    def observe(self, mac, ip, seen=None) -> None:
+        host = self.hosts.get(mac)
+
+        if host is None:
+            self.hosts[mac] = [ip, seen or time.time()]
+        else:
+            host[0] = ip
+            host[1] = seen or time.time()
+
+        self.dirty.add(mac)
+
+    def takeChanges(self): # -> [{'ip': x, 'mac': x}]
+        changes = [{'ip': self.hosts[mac][0], 'mac': mac} for mac in self.dirty]
+        self.dirty = set()
+        return changes
+
+    def restoreChanges(self, changes) -> None:
+        # A failed write puts its hosts back, so the next flush retries them
+        self.dirty.update(change['mac'] for change in changes)
+
+class PresenceDaemon:
+    def __init__(self, tableUpdater, networker, interfaces, flushInterval=5, sweepInterval=900, Transport=PacketTransport,
+                 metricsFile=None, metricsPort=0):
+        self.Transport = Transport
+        self.tableUpdater = tableUpdater
+        self.networker = networker
+        self.interfaces = interfaces or [None]
+        self.flushInterval = flushInterval
+        self.sweepInterval = sweepInterval
+        self.metricsFile = metricsFile
+        self.metricsPort = metricsPort
+
+        self.state = PresenceState()
+        self.transports = []
+        self.stopping = None
+        self.metricsServer = None
+
+    def run(self) -> None:
+        asyncio.run(self.runAsync())
+
+    async def runAsync(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+
+        for signalNumber in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signalNumber, self.stopping.set)
+
+        try:
+            for interface in self.interfaces:
+                transport = self.Transport(interface)
+                self.transports.append(transport)
+                loop.add_reader(transport.fileno(), self.__onReadable, transport)
+                print(f'Listening for ARP on {transport.interface}')
+        except OSError as e:
+            print(f'Error when opening raw socket @PresenceDaemon: {e}')
+            self.__closeTransports(loop)
+            return
+
+        if self.metricsPort:
+            try:
+                self.metricsServer = metrics.MetricsServer(self.metricsPort)
+                print(f'Serving metrics on http://127.0.0.1:{self.metricsPort}/metrics')
+            except OSError as e:
+                print(f'Error when starting metrics server @PresenceDaemon: {e}')
+
+        tasks = [asyncio.create_task(self.__flushLoop())]
+        if self.sweepInterval:
+            tasks.append(asyncio.create_task(self.__sweepLoop()))
+
+        await self.stopping.wait()
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.__closeTransports(loop)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f'Error when flushing @PresenceDaemon: {e}')
+        self.tableUpdater.close()
+
+        if self.metricsServer is not None:
+            self.metricsServer.close()
+
+    def __onReadable(self, transport) -> None:
+        while True:
+            frame = transport.recv()
+            if frame is None:
+                return
+
+            packet = parseArpFrame(frame)
+
+            # Requests, replies and gratuitous ARP all carry the sender's binding; probes use 0.0.0.0
+            if packet is not None and packet.senderIp != UNSPECIFIED_IP:
+                self.state.observe(macToStr(packet.senderMac), packet.senderIp)
+
+    def flush(self) -> None:
+        changes = self.state.takeChanges()
+        if changes:
+            try:
+                self.tableUpdater.updateObserved(changes)
+            except Exception:
+                self.state.restoreChanges(changes)
+                raise
+
+        self.writeMetrics()
+
+    def writeMetrics(self) -> None:
+        if not self.metricsFile:
+            return
+
+        try:
+            metrics.writeTextfile(self.metricsFile)
+        except OSError as e:
+            print(f'Error when writing metrics @PresenceDaemon: {e}')
+
+    async def __flushLoop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flushInterval)
+
+            # A failed flush (e.g. a locked database) is retried next interval instead of ending the loop
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'Error when flushing @PresenceDaemon: {e}')
+
+    async def __sweepLoop(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await asyncio.sleep(self.sweepInterval)
+
+            # The sweep blocks on the network, so it runs off-loop; the database stays on this thread
+            try:
+                arpResult = await loop.run_in_executor(None, self.networker.getUncachedArp)
+
+                self.flush()
+                self.tableUpdater.update(arpResult=arpResult, expire=True)
+                self.writeMetrics()
+            except Exception as e:
+                print(f'Error when sweeping @PresenceDaemon: {e}')
+                continue
+
+            seen = time.time()
+            for arpDict in arpResult:
+                host = self.state.hosts.setdefault(arpDict['mac'], [arpDict['ip'], seen])
+                host[0], host[1] = arpDict['ip'], seen
+
+    def __closeTransports(self, loop) -> None:
+        for transport in self.transports:
+            loop.remove_reader(transport.fileno())
+            transport.close()
+        self.transports = []
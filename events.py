@@ -0,0 +1,248 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque
+
+NEW_UNKNOWN = 'new-unknown-device'
+ONLINE = 'known-online'
+OFFLINE = 'known-offline'
+IP_CHANGED = 'ip-changed'
+MAC_FLAPPING = 'mac-flapping'
+
+class ChangeEvent:
+    __slots__ = ('kind', 'mac', 'ip', 'previousIp', 'name', 'time')
+
+    def __init__(self, kind, mac, ip=None, previousIp=None, name=None, time=None):
+        self.kind = kind
+        self.mac = mac
+        self.ip = ip
+        self.previousIp = previousIp
+        self.name = name
+        self.time = time
+
+    def toDict(self):
+        return {slot: getattr(self, slot) for slot in ChangeEvent.__slots__}
+
+    def toJson(self):
+        return json.dumps(self.toDict(), separators=(',', ':'))
+
+    def __repr__(self):
+        return f'ChangeEvent({self.kind}, {self.mac}, {self.previousIp} -> {self.ip})'
+
+class FlapDetector:
+    # Flags a MAC whose ip changes more than 'threshold' times within 'window' seconds across scans.
+    # With a connection the change times are kept in arp.db (flapChanges), so flaps spread over
+    # separate -u runs are seen too; without one they only live as long as the process.
+    def __init__(self, window=600, threshold=3, connection=None):
+        self.window = window
+        self.threshold = threshold
+        self.connection = connection
+        self.changes = {} # mac -> deque of change times
+
+    def isFlapping(self, mac, seen) -> bool:
+        if self.connection is not None:
+            return self.__isFlappingStored(mac, seen)
+
+        changes = self.changes.setdefault(mac, deque())
+        changes.append(seen)
+        while changes and changes[0] < seen - self.window:
+            changes.popleft()
+        return len(changes) > self.threshold
+
+    def __isFlappingStored(self, mac, seen) -> bool:
+        from addresses import adapt
+
+        mac = adapt('mac', mac)
+        with self.connection.transaction():
+            # Changes of every MAC that fell out of the window go too, so the table stays small
+            self.connection.execute('DELETE FROM flapChanges WHERE time < ?', (seen - self.window,))
+            self.connection.execute('INSERT INTO flapChanges (mac, time) VALUES (?, ?)', (mac, seen))
+            changes = self.connection.execute('SELECT count(*) FROM flapChanges WHERE mac = ?', (mac,)).fetchone()[0]
+
+        return changes > self.threshold
+
+def eventsFromDelta(delta, known=True, unknown=True, flapDetector=None, seen=None): # -> [ChangeEvent]
+    seen = seen or time.time()
+    events = []
+
+    if unknown:
+        events.extend(ChangeEvent(NEW_UNKNOWN, mac, ip, time=seen) for ip, mac in delta.inserts)
+
+    if known:
+        for mac, name, previousIp, ip in delta.knownChanges:
+            if ip is None:
+                events.append(ChangeEvent(OFFLINE, mac, None, previousIp, name, seen))
+            elif previousIp is None:
+                events.append(ChangeEvent(ONLINE, mac, ip, None, name, seen))
+            else:
+                events.append(ChangeEvent(IP_CHANGED, mac, ip, previousIp, name, seen))
+                if flapDetector is not None and flapDetector.isFlapping(mac, seen):
+                    events.append(ChangeEvent(MAC_FLAPPING, mac, ip, previousIp, name, seen))
+
+    for mac, ips in delta.flapping:
+        events.append(ChangeEvent(MAC_FLAPPING, mac, ips[-1], ips[0], time=seen))
+
+    return events
+
+class StdoutSink:
+    async def send(self, event) -> None:
+        sys.stdout.write(event.toJson() + '\n')
+        sys.stdout.flush()
+
+    async def close(self) -> None:
+        pass
+
+class UnixSocketSink:
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    async def send(self, event) -> None:
+        # Connects lazily and reconnects once if the listener went away
+        for attempt in range(2):
+            try:
+                if self.writer is None:
+                    _, self.writer = await asyncio.open_unix_connection(self.path)
+                self.writer.write(event.toJson().encode() + b'\n')
+                await self.writer.drain()
+                return
+            except OSError:
+                self.writer = None
+
+        raise OSError(f'Unix socket {self.path} is not accepting events')
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+
+class WebhookSink:
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    async def send(self, event) -> None:
+        request = urllib.request.Request(self.url, event.toJson().encode(), {'Content-Type': 'application/json'})
+        # urllib blocks, so each post runs on the default executor
+        await asyncio.get_running_loop().run_in_executor(None, self.__post, request)
+
+    def __post(self, request) -> None:
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    async def close(self) -> None:
+        pass
+
+class SyslogSink:
+    def __init__(self, ident='arpmanager'):
+        import syslog
+        self.syslog = syslog
+        self.syslog.openlog(ident, 0, syslog.LOG_DAEMON)
+
+    async def send(self, event) -> None:
+        self.syslog.syslog(self.syslog.LOG_NOTICE, event.toJson())
+
+    async def close(self) -> None:
+        self.syslog.closelog()
+
+SINKS = {
+    'stdout': lambda sinkConfig: StdoutSink(),
+    'unix': lambda sinkConfig: UnixSocketSink(sinkConfig['path']),
+    'webhook': lambda sinkConfig: WebhookSink(sinkConfig['url'], sinkConfig.get('timeout', 5)),
+    'syslog': lambda sinkConfig: SyslogSink(sinkConfig.get('ident', 'arpmanager')),
+}
+
+class EventDispatcher:
+    # Fans events out to sinks from an asyncio loop on a background thread. Each sink has its own
+    # bounded queue, so one slow sink only stalls (overflow 'block') or drops (overflow 'drop') its own events.
+    def __init__(self, sinks, queueSize=1000, overflow='block'):
+        self.sinks = sinks
+        self.queueSize = queueSize
+        self.overflow = overflow
+        self.dropped = 0
+
+        self.loop = asyncio.new_event_loop()
+        self.queues = []
+        self.workers = []
+        self.thread = threading.Thread(target=self.loop.run_forever, name='EventDispatcher', daemon=True)
+        self.thread.start()
+
+        asyncio.run_coroutine_threadsafe(self.__start(), self.loop).result()
+
+    @staticmethod
+    def fromConfig(eventsConfig): # -> EventDispatcher | None
+        if not eventsConfig['sinks']:
+            return None
+
+        sinks = []
+        for sinkConfig in eventsConfig['sinks']:
+            if sinkConfig['type'] not in SINKS:
+                print(f"Unknown event sink: {sinkConfig['type']}")
+                continue
+            sinks.append(SINKS[sinkConfig['type']](sinkConfig))
+
+        return EventDispatcher(sinks, eventsConfig['queueSize'], eventsConfig['overflow']) if sinks else None
+
+    async def __start(self) -> None:
+        for sink in self.sinks:
+            queue = asyncio.Queue(self.queueSize)
+            self.queues.append(queue)
+            self.workers.append(asyncio.create_task(self.__drain(sink, queue)))
+
+    async def __drain(self, sink, queue) -> None:
+        while True:
+            event = await queue.get()
+            try:
+                await sink.send(event)
+            except Exception as e:
+                print(f'Error in event sink {type(sink).__name__}: {e}', file=sys.stderr)
+            finally:
+                queue.task_done()
+
+    async def __enqueue(self, events) -> None:
+        for queue in self.queues:
+            for event in events:
+                if self.overflow == 'drop':
+                    try:
+                        queue.put_nowait(event)
+                    except asyncio.QueueFull:
+                        self.dropped += 1
+                else:
+                    await queue.put(event)
+
+    def publish(self, events) -> None:
+        if not events:
+            return
+
+        future = asyncio.run_coroutine_threadsafe(self.__enqueue(events), self.loop)
+        # Backpressure: with overflow 'block' the publisher waits until every queue has room
+        if self.overflow != 'drop':
+            future.result()
+
+    def close(self, timeout=10) -> None:
+        async def drainAndStop():
+            try:
+                await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), timeout)
+            except asyncio.TimeoutError:
+                print('Timed out delivering change events', file=sys.stderr)
+
+            for worker in self.workers:
+                worker.cancel()
+            await asyncio.gather(*self.workers, return_exceptions=True)
+
+            for sink in self.sinks:
+                await sink.close()
+
+        asyncio.run_coroutine_threadsafe(drainAndStop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+        if self.dropped:
+            print(f'Dropped {self.dropped} change events', file=sys.stderr)
@@ -1,17 +1,147 @@
-from PyQt6.QtWidgets import QApplication, QMainWindow, QTextEdit, QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QLabel
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication, QMainWindow, QTableView, QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QLabel, QCheckBox
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
 
 import sys
 import os
 
+from config import Config
+from mainlite import Database, Table, Networker, TableUpdater
+
+KNOWN_COLUMNS = [('name', 'Name'), ('ip', 'IP'), ('mac', 'MAC'), ('time', 'Added')]
+UNKNOWN_COLUMNS = [('ip', 'IP'), ('mac', 'MAC'), ('time', 'Last seen')]
+
+class EntryModel(QAbstractTableModel):
+    # Rows are (id, value, value, ...) tuples sorted by id. applyRows() turns a fresh snapshot into
+    # row-level inserts, removes and dataChanged signals, so the view only repaints what changed.
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self.columns = [column for column, _ in columns]
+        self.headers = [header for _, header in columns]
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+
+        value = self.rows[index.row()][index.column() + 1]
+        return 'NULL' if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def applyRows(self, rows) -> None: # [(id, ...)] sorted by id
+        newRows = {row[0]: row for row in rows}
+
+        # Removed rows go first, bottom-up and one signal per contiguous run
+        position = len(self.rows) - 1
+        while position >= 0:
+            if self.rows[position][0] in newRows:
+                position -= 1
+                continue
+
+            last = position
+            while position >= 0 and self.rows[position][0] not in newRows:
+                position -= 1
+
+            self.beginRemoveRows(QModelIndex(), position + 1, last)
+            del self.rows[position + 1:last + 1]
+            self.endRemoveRows()
+
+        for position, row in enumerate(self.rows):
+            if newRows[row[0]] != row:
+                self.rows[position] = newRows[row[0]]
+                self.dataChanged.emit(self.index(position, 0), self.index(position, len(self.columns) - 1))
+
+        # Ids are AUTOINCREMENT, so new rows normally sort after every row already shown
+        lastId = self.rows[-1][0] if self.rows else None
+        existing = {row[0] for row in self.rows}
+        added = [row for row in rows if row[0] not in existing]
+
+        if not added:
+            return
+
+        if lastId is None or added[0][0] > lastId:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(added) - 1)
+            self.rows.extend(added)
+            self.endInsertRows()
+        else:
+            self.beginResetModel()
+            self.rows = list(rows)
+            self.endResetModel()
+
+class WorkerSignals(QObject):
+    finished = pyqtSignal(object, object)  # (knownRows, unknownRows)
+    failed = pyqtSignal(str)
+
+class ScanWorker(QRunnable):
+    # Runs on the thread pool with its own connection, since a sqlite3 connection belongs to the
+    # thread that opened it. The UI thread only ever sees the finished snapshots.
+    def __init__(self, openDatabase, networker, config, scan=True):
+        super().__init__()
+        self.openDatabase = openDatabase
+        self.networker = networker
+        self.config = config
+        self.scan = scan
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            # Scanned before the database is opened, as the CLI does, so no lock is held while waiting on the network
+            arpResult = self.networker.getUncachedArp() if self.scan else None
+
+            database = self.openDatabase()
+            try:
+                knownTable = Table(database.getKnownTableName(), 1, database.getCursor(), database.getConnection())
+                unknownTable = Table(database.getUnknownTableName(), 0, database.getCursor(), database.getConnection())
+
+                if self.scan:
+                    tableUpdater = TableUpdater(knownTable, unknownTable, self.networker, self.config)
+                    try:
+                        tableUpdater.update(arpResult=arpResult, expire=True)
+                    finally:
+                        tableUpdater.close()
+
+                knownRows = ScanWorker.snapshot(knownTable, KNOWN_COLUMNS)
+                unknownRows = ScanWorker.snapshot(unknownTable, UNKNOWN_COLUMNS)
+            finally:
+                database.getConnection().close()
+
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+            return
+
+        self.signals.finished.emit(knownRows, unknownRows)
+
+    @staticmethod
+    def snapshot(table, columns): # -> [(id, ...)] sorted by id
+        sql, params = table.buildSelect(['id'] + [column for column, _ in columns])
+        return sorted(tuple(entry) for entry in table.connection.execute(sql, params))
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, openDatabase, networker, config):
         super().__init__()
         self.windowSizeWidth = 700
         self.windowSizeHeight = 500
-        self.setWindowTitle('Title')
+        self.setWindowTitle('ARPManager')
         self.setGeometry(0, 0, self.windowSizeWidth, self.windowSizeHeight)
 
+        self.openDatabase = openDatabase
+        self.networker = networker
+        self.config = config
+
+        # One worker at a time: a scan that is still running is not queued a second time
+        self.threadPool = QThreadPool(self)
+        self.threadPool.setMaxThreadCount(1)
+        self.busy = False
+
         # Here I define the centralWidget to be a new widget
         centralWidget = QWidget()
         self.setCentralWidget(centralWidget)
@@ -19,46 +149,42 @@ class MainWindow(QMainWindow):
         # Layouts
         outsideLayout = QVBoxLayout()
         # Layouts to add to the outside layout/main layout
-        consoleContainerLayout = QVBoxLayout()        
-
-        consoleColumnContainerLayout = QHBoxLayout()
-        consoleColumnKnownLayout = QHBoxLayout()
-        consoleColumnUnknownLayout = QHBoxLayout()
+        consoleContainerLayout = QVBoxLayout()
 
+        consoleTitleLayout = QHBoxLayout()
         consoleRowLayout = QHBoxLayout()
-        consoleCommandLayout = QVBoxLayout()
 
+        buttonLayout = QHBoxLayout()
 
-        buttonLayout = QHBoxLayout() 
+        # Define widgets to add to layout here
+        self.knownModel = EntryModel(KNOWN_COLUMNS, self)
+        self.unknownModel = EntryModel(UNKNOWN_COLUMNS, self)
 
-        # Define widgets to addd to layout here
-        self.columnKnownNameLabel = QLabel('Name', self)
-        self.columnKnownNameLabel.setStyleSheet('background-color: grey; color: black;')
-        self.columnKnownIpLabel = QLabel('IP', self)
-        self.columnKnownIpLabel.setStyleSheet('background-color: white; color: black;')
-        self.columnKnownMacLabel = QLabel('MAC', self)
-        self.columnKnownMacLabel.setStyleSheet('background-color: grey; color: black;')
+        self.knownConsole = MainWindow.createView(self.knownModel, self)
+        self.unknownConsole = MainWindow.createView(self.unknownModel, self)
 
-        self.columnUnknownIpLabel = QLabel('IP', self)
-        self.columnUnknownIpLabel.setStyleSheet('background-color: grey; color: black;')
-        self.columnUnknownMacLabel = QLabel('MAC', self)
-        self.columnUnknownMacLabel.setStyleSheet('background-color: white; color: black;')
+        self.knownLabel = QLabel('Known', self)
+        self.unknownLabel = QLabel('Unknown', self)
+        self.statusLabel = QLabel('', self)
 
-        self.knownConsole = QTextEdit(self)
-        self.unknownConsole = QTextEdit(self)
         self.updateButton = QPushButton(text='Update')
+        self.updateButton.clicked.connect(self.startScan)
+
+        self.autoRefreshBox = QCheckBox('Auto refresh', self)
+        self.autoRefreshTimer = QTimer(self)
+        self.autoRefreshTimer.timeout.connect(self.startScan)
+        self.autoRefreshBox.toggled.connect(self.setAutoRefresh)
 
         # Add widgets to layouts here
-        consoleColumnKnownLayout.addWidget(self.columnKnownNameLabel)
-        consoleColumnKnownLayout.addWidget(self.columnKnownIpLabel)
-        consoleColumnKnownLayout.addWidget(self.columnKnownMacLabel)
+        consoleTitleLayout.addWidget(self.knownLabel)
+        consoleTitleLayout.addWidget(self.unknownLabel)
 
-        consoleColumnUnknownLayout.addWidget(self.columnUnknownIpLabel)
-        consoleColumnUnknownLayout.addWidget(self.columnUnknownMacLabel)
+        consoleRowLayout.addWidget(self.knownConsole)
+        consoleRowLayout.addWidget(self.unknownConsole)
 
-        consoleRowLayout.addWidget(self.knownConsole)        
-        consoleRowLayout.addWidget(self.unknownConsole)   
         buttonLayout.addWidget(self.updateButton)
+        buttonLayout.addWidget(self.autoRefreshBox)
+        buttonLayout.addWidget(self.statusLabel)
 
         # Set centralWidget to use outsideLayout which is the main layout
         centralWidget.setLayout(outsideLayout)
@@ -66,12 +192,62 @@ class MainWindow(QMainWindow):
         outsideLayout.addLayout(consoleContainerLayout)
         outsideLayout.addLayout(buttonLayout)
         # Add layouts to the consoleContainerLayout
-        consoleColumnContainerLayout.addLayout(consoleColumnKnownLayout)
-        consoleColumnContainerLayout.addLayout(consoleColumnUnknownLayout)
-        consoleContainerLayout.addLayout(consoleColumnContainerLayout)
-
+        consoleContainerLayout.addLayout(consoleTitleLayout)
         consoleContainerLayout.addLayout(consoleRowLayout)
 
+        self.autoRefreshBox.setChecked(bool(self.config.get('gui', 'refreshInterval')))
+
+    @staticmethod
+    def createView(model, parent):
+        view = QTableView(parent)
+        view.setModel(model)
+        view.verticalHeader().setVisible(False)
+        view.horizontalHeader().setStretchLastSection(True)
+        # Uniform row heights let the view lay out 10k+ rows without measuring each one
+        view.verticalHeader().setDefaultSectionSize(view.fontMetrics().height() + 6)
+        return view
+
+    def setAutoRefresh(self, enabled) -> None:
+        if enabled:
+            self.autoRefreshTimer.start(int((self.config.get('gui', 'refreshInterval') or 60) * 1000))
+        else:
+            self.autoRefreshTimer.stop()
+
+    def startScan(self) -> None:
+        self.startWorker(scan=True)
+
+    def loadTables(self) -> None:
+        self.startWorker(scan=False)
+
+    def startWorker(self, scan) -> None:
+        if self.busy:
+            return
+
+        self.busy = True
+        self.updateButton.setEnabled(False)
+        self.statusLabel.setText('Scanning...' if scan else 'Loading...')
+
+        worker = ScanWorker(self.openDatabase, self.networker, self.config, scan)
+        worker.signals.finished.connect(self.onFinished)
+        worker.signals.failed.connect(self.onFailed)
+        self.threadPool.start(worker)
+
+    def onFinished(self, knownRows, unknownRows) -> None:
+        self.knownModel.applyRows(knownRows)
+        self.unknownModel.applyRows(unknownRows)
+
+        self.knownLabel.setText(f'Known ({len(knownRows)})')
+        self.unknownLabel.setText(f'Unknown ({len(unknownRows)})')
+        self.onDone('')
+
+    def onFailed(self, error) -> None:
+        self.onDone(f'Error: {error}')
+
+    def onDone(self, status) -> None:
+        self.busy = False
+        self.updateButton.setEnabled(True)
+        self.statusLabel.setText(status)
+
     def resizeEvent(self, event):
         super().resizeEvent(event)
 
@@ -80,11 +256,30 @@ class MainWindow(QMainWindow):
 
         self.updateButton.setFixedSize(int(width/5), int(height/9))
 
-        print(f"Window size: {width}x{height}")
+    def closeEvent(self, event):
+        self.autoRefreshTimer.stop()
+        self.threadPool.waitForDone()
+        super().closeEvent(event)
+
+def main():
+    # Same files as the CLI, so both see the same tables
+    directory = os.path.dirname(os.path.abspath(__file__))
+    config = Config.load(os.path.join(directory, 'arpmanager.json'))
+    databasePath = os.path.join(directory, 'arp.db')
+
+    def openDatabase():
+        database = Database(databasePath, 'knownEntries', 'unknownEntries', config.get('database'))
+        if database.needsMigration():
+            database.createTables()
+        return database
+
+    app = QApplication(sys.argv)
+    window = MainWindow(openDatabase, Networker(config, databasePath), config)
 
-app = QApplication(sys.argv)
-window = MainWindow()
+    window.show()
+    window.loadTables()
 
-window.show()
+    sys.exit(app.exec())
 
-sys.exit(app.exec())
\ No newline at end of file
+if __name__ == '__main__':
+    main()
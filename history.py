@@ -0,0 +1,141 @@
+import time
+
+from addresses import adapt, MAC_TYPE, IPV4_TYPE
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+class PresenceHistory:
+    # Append-only observations, compacted into hourly and daily presence buckets.
+    # Each level has a watermark: rows below it have been rolled up into the next level,
+    # so queries read raw rows above the hourly watermark, hourly rows above the daily
+    # watermark and daily rows below it, and never count a sighting twice.
+    def __init__(self, connection, config):
+        self.connection = connection
+        self.rawRetention = config['rawRetention']
+        self.hourlyRetention = config['hourlyRetention']
+        self.dailyRetention = config['dailyRetention']
+
+    @staticmethod
+    def createTables(cursor) -> None:
+        cursor.execute(f'''CREATE TABLE IF NOT EXISTS observations (
+            mac {MAC_TYPE} NOT NULL,
+            ip {IPV4_TYPE},
+            seen INTEGER NOT NULL
+        )''')
+        # Covering index for per-MAC range queries; the second one serves retention deletes
+        cursor.execute('CREATE INDEX IF NOT EXISTS observations_mac_seen ON observations (mac, seen, ip)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS observations_seen ON observations (seen)')
+
+        for tableName in ('presenceHourly', 'presenceDaily'):
+            cursor.execute(f'''CREATE TABLE IF NOT EXISTS {tableName} (
+                mac {MAC_TYPE} NOT NULL,
+                bucket INTEGER NOT NULL,
+                ip {IPV4_TYPE},
+                firstSeen INTEGER NOT NULL,
+                lastSeen INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                PRIMARY KEY (mac, bucket, ip)
+            ) WITHOUT ROWID''')
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {tableName}_bucket ON {tableName} (bucket)')
+
+        cursor.execute('''CREATE TABLE IF NOT EXISTS rollupWatermarks (
+            level TEXT PRIMARY KEY,
+            watermark INTEGER NOT NULL
+        )''')
+
+    def record(self, arpResult, seen=None) -> None:
+        # Runs inside the caller's scan transaction, so it is committed together with the table updates
+        seen = int(seen or time.time())
+        self.connection.executemany('INSERT INTO observations (mac, ip, seen) VALUES (?, ?, ?)',
+                                    [(adapt('mac', arpDict['mac']), adapt('ip', arpDict['ip']), seen)
+                                     for arpDict in arpResult])
+
+    def getWatermark(self, level):
+        row = self.connection.execute('SELECT watermark FROM rollupWatermarks WHERE level=?', (level,)).fetchone()
+        return row[0] if row else 0
+
+    def __setWatermark(self, level, watermark) -> None:
+        self.connection.execute('''INSERT INTO rollupWatermarks (level, watermark) VALUES (?, ?)
+            ON CONFLICT(level) DO UPDATE SET watermark=excluded.watermark''', (level, watermark))
+
+    def rollup(self, now=None) -> None:
+        now = int(now or time.time())
+        hourCutoff = now - now % HOUR
+        dayCutoff = now - now % DAY
+
+        with self.connection.transaction():
+            # Only whole hours and days are rolled up, so a bucket is never written twice
+            hourlyWatermark = self.getWatermark('hourly')
+            if hourCutoff > hourlyWatermark:
+                self.connection.execute('''INSERT INTO presenceHourly (mac, bucket, ip, firstSeen, lastSeen, samples)
+                    SELECT mac, seen - seen % 3600, ip, min(seen), max(seen), count(*) FROM observations
+                    WHERE seen >= ? AND seen < ? GROUP BY mac, seen - seen % 3600, ip
+                    ON CONFLICT(mac, bucket, ip) DO UPDATE SET
+                        firstSeen = min(firstSeen, excluded.firstSeen),
+                        lastSeen = max(lastSeen, excluded.lastSeen),
+                        samples = samples + excluded.samples''', (hourlyWatermark, hourCutoff))
+                self.__setWatermark('hourly', hourCutoff)
+
+            dailyWatermark = self.getWatermark('daily')
+            if dayCutoff > dailyWatermark:
+                self.connection.execute('''INSERT INTO presenceDaily (mac, bucket, ip, firstSeen, lastSeen, samples)
+                    SELECT mac, bucket - bucket % 86400, ip, min(firstSeen), max(lastSeen), sum(samples) FROM presenceHourly
+                    WHERE bucket >= ? AND bucket < ? GROUP BY mac, bucket - bucket % 86400, ip
+                    ON CONFLICT(mac, bucket, ip) DO UPDATE SET
+                        firstSeen = min(firstSeen, excluded.firstSeen),
+                        lastSeen = max(lastSeen, excluded.lastSeen),
+                        samples = samples + excluded.samples''', (dailyWatermark, dayCutoff))
+                self.__setWatermark('daily', dayCutoff)
+
+            self.__applyRetention(now)
+
+    def __applyRetention(self, now) -> None:
+        # Rows are only dropped once the next level holds them
+        rawCutoff = min(now - self.rawRetention, self.getWatermark('hourly'))
+        self.connection.execute('DELETE FROM observations WHERE seen < ?', (rawCutoff,))
+
+        hourlyCutoff = min(now - self.hourlyRetention, self.getWatermark('daily'))
+        self.connection.execute('DELETE FROM presenceHourly WHERE bucket < ?', (hourlyCutoff,))
+
+        if self.dailyRetention:
+            self.connection.execute('DELETE FROM presenceDaily WHERE bucket < ?', (now - self.dailyRetention,))
+
+    def getPresence(self, mac, since=0, until=None): # -> [{'start': x, 'end': x, 'ip': x, 'samples': x, 'resolution': x}]
+        until = int(until or time.time() + 1) # exclusive
+        mac = adapt('mac', mac)
+        hourlyWatermark = self.getWatermark('hourly')
+        dailyWatermark = self.getWatermark('daily')
+        presence = []
+
+        levels = (('day', 'presenceDaily', DAY, since, min(until, dailyWatermark)),
+                  ('hour', 'presenceHourly', HOUR, max(since, dailyWatermark), min(until, hourlyWatermark)))
+
+        for resolution, tableName, bucketSize, lower, upper in levels:
+            if lower >= upper:
+                continue
+
+            rows = self.connection.execute(f'''SELECT bucket, ip, firstSeen, lastSeen, samples FROM {tableName}
+                WHERE mac=? AND bucket >= ? AND bucket < ? ORDER BY bucket''', (mac, lower - lower % bucketSize, upper))
+            presence.extend({'start': row['firstSeen'], 'end': row['lastSeen'], 'ip': row['ip'],
+                             'samples': row['samples'], 'resolution': resolution}
+                            for row in rows if row['lastSeen'] >= since and row['firstSeen'] < until)
+
+        rows = self.connection.execute('''SELECT ip, min(seen) AS firstSeen, max(seen) AS lastSeen, count(*) AS samples
+            FROM observations WHERE mac=? AND seen >= ? AND seen < ?
+            GROUP BY seen - seen % 3600, ip ORDER BY firstSeen''', (mac, max(since, hourlyWatermark), until))
+        presence.extend({'start': row['firstSeen'], 'end': row['lastSeen'], 'ip': row['ip'],
+                         'samples': row['samples'], 'resolution': 'raw'} for row in rows)
+
+        return presence
+
+    def getIps(self, mac, since=0, until=None): # -> [{'ip': x, 'firstSeen': x, 'lastSeen': x, 'samples': x}]
+        ips = {}
+        for interval in self.getPresence(mac, since, until):
+            ip = ips.setdefault(interval['ip'], {'ip': interval['ip'], 'firstSeen': interval['start'],
+                                                 'lastSeen': interval['end'], 'samples': 0})
+            ip['firstSeen'] = min(ip['firstSeen'], interval['start'])
+            ip['lastSeen'] = max(ip['lastSeen'], interval['end'])
+            ip['samples'] += interval['samples']
+
+        return sorted(ips.values(), key=lambda ip: ip['lastSeen'], reverse=True)
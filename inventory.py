@@ -0,0 +1,192 @@
+import csv
+import json
+import os
+import sys
+
+from addresses import adapt, isValidMac, MAC_PATTERN
+
+# Bulk import and export of device inventories. Records are read, validated and written in
+# batches, so a 20k-entry asset register is one transaction rather than 20k process launches,
+# and exports stream from a cursor. Parquet and Arrow need pyarrow and are only loaded for those formats.
+
+BATCH_SIZE = 5000
+POLICIES = ('skip', 'replace', 'merge')
+FORMATS = ('csv', 'jsonl', 'ndjson', 'parquet', 'arrow')
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'jsonl',
+              '.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow'}
+
+# The first column is the one each table requires besides mac
+IMPORT_COLUMNS = {1: ('name', 'mac', 'ip', 'time'), 0: ('ip', 'mac', 'time')}
+
+def getFormat(path, format=None):
+    if format:
+        if format not in FORMATS:
+            raise ValueError(f'Unknown format: {format}')
+        return 'jsonl' if format == 'ndjson' else format
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f'Cannot tell the format of {path}, pass --format')
+    return EXTENSIONS[extension]
+
+def importPyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ValueError('Parquet and Arrow files need pyarrow (pip install pyarrow)')
+
+def findPyarrowCompute(): # -> pyarrow.compute | None, for the optional columnar paths
+    try:
+        import pyarrow.compute
+        return pyarrow.compute
+    except ImportError:
+        return None
+
+def iterBatches(path, format): # -> [{'mac': x, ...}] | pyarrow.RecordBatch, ...
+    if format == 'csv':
+        with open(path, newline='') as inputFile:
+            yield from chunked(csv.DictReader(inputFile))
+
+    elif format == 'jsonl':
+        with open(path) as inputFile:
+            yield from chunked(json.loads(line) for line in inputFile if line.strip())
+
+    elif format == 'parquet':
+        importPyarrow()
+        import pyarrow.parquet
+        # Record batches are passed on as they are, so validateBatch can work on the mac column
+        yield from pyarrow.parquet.ParquetFile(path).iter_batches(BATCH_SIZE)
+
+    else:
+        pyarrow = importPyarrow()
+        import pyarrow.ipc
+        with pyarrow.memory_map(path) as source:
+            try:
+                reader = pyarrow.ipc.open_file(source)
+                batches = (reader.get_batch(index) for index in range(reader.num_record_batches))
+            except pyarrow.ArrowInvalid:
+                source.seek(0)
+                batches = pyarrow.ipc.open_stream(source)
+
+            yield from batches
+
+def chunked(records):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def matchMacs(records): # -> ([mac], [bool])
+    compute = findPyarrowCompute()
+
+    # With pyarrow the whole column is trimmed and matched in one call; without it each MAC goes
+    # through the same pattern MacValidator uses
+    if hasattr(records, 'schema'):
+        column = records.column('mac').cast('string') if 'mac' in records.schema.names else None
+    elif compute is not None:
+        import pyarrow
+        column = pyarrow.array([None if record.get('mac') is None else str(record.get('mac')) for record in records], pyarrow.string())
+    else:
+        macs = [str(record.get('mac') or '').strip() for record in records]
+        return macs, [isValidMac(mac) for mac in macs]
+
+    if column is None:
+        return [''] * records.num_rows, [False] * records.num_rows
+
+    column = compute.utf8_trim_whitespace(compute.fill_null(column, ''))
+    matches = compute.fill_null(compute.match_substring_regex(column, f'^{MAC_PATTERN}$'), False)
+    return column.to_pylist(), matches.to_pylist()
+
+def validateBatch(records, columns): # -> ([(value, ...)], [(record, reason)])
+    macs, matches = matchMacs(records)
+    if hasattr(records, 'schema'):
+        records = records.to_pylist()
+
+    rows = []
+    invalid = []
+    for record, mac, match in zip(records, macs, matches):
+        if not match:
+            invalid.append((record, f'invalid MAC address {mac!r}'))
+            continue
+
+        required = record.get(columns[0])
+        if required is None or required == '':
+            invalid.append((record, f'missing {columns[0]}'))
+            continue
+
+        try:
+            rows.append(tuple(adapt(column, mac if column == 'mac' else (record.get(column) or None))
+                              for column in columns))
+        except (ValueError, TypeError, AttributeError) as e:
+            invalid.append((record, str(e)))
+
+    return rows, invalid
+
+def importFile(table, path, format=None, policy='skip'): # -> (rows changed, [(record, reason)])
+    if policy not in POLICIES:
+        raise ValueError(f'Unknown policy: {policy}')
+    format = getFormat(path, format)
+
+    columns = None
+    invalid = []
+    before = table.connection.total_changes
+
+    # One transaction for the whole file: a failure part way through leaves the table untouched
+    with table.transaction():
+        for records in iterBatches(path, format):
+            if columns is None:
+                # Only columns present in the file are written, so merge and replace leave the others alone
+                present = set(records.schema.names) if hasattr(records, 'schema') else set().union(*records)
+                columns = [column for column in IMPORT_COLUMNS[table.isKnownTable]
+                           if column in present or column in IMPORT_COLUMNS[table.isKnownTable][:2]]
+
+            rows, batchInvalid = validateBatch(records, columns)
+            invalid.extend(batchInvalid)
+            table.importRows(columns, rows, policy)
+
+    return table.connection.total_changes - before, invalid
+
+def exportFile(table, path, format=None, columns=None, where=None) -> None:
+    format = 'jsonl' if path == '-' and not format else getFormat(path, format)
+
+    if format in ('csv', 'jsonl'):
+        if path == '-':
+            table.select(format, columns, where, stream=sys.stdout)
+            return
+        with open(path, 'w', newline='') as outputFile:
+            table.select(format, columns, where, stream=outputFile)
+        return
+
+    exportArrow(table, path, format, columns, where)
+
+def exportArrow(table, path, format, columns=None, where=None) -> None:
+    pyarrow = importPyarrow()
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    sql, params = table.buildSelect(columns, where)
+    columns = columns or table.getColumns()
+    schema = pyarrow.schema([(column, pyarrow.int64() if column == 'id' else pyarrow.string()) for column in columns])
+
+    if format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+    else:
+        writer = pyarrow.ipc.new_file(path, schema)
+
+    # One record batch per fetchmany chunk, so memory stays at one chunk however large the table is
+    try:
+        cursor = table.connection.execute(sql, params)
+        while True:
+            entries = cursor.fetchmany(BATCH_SIZE)
+            if not entries:
+                break
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array([entry[index] for entry in entries], type=field.type) for index, field in enumerate(schema)],
+                schema=schema))
+    finally:
+        writer.close()
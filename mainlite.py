@@ -1,70 +1,145 @@
-import re
 import sqlite3
-import subprocess
 import sys
 import os
-from tabulate import tabulate
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from commands import *
+import arpparser
+import metrics
+import output
+from reconciler import Reconciler
+from config import Config
+from scancache import ScanCache
+from history import PresenceHistory
+from addresses import adapt, isValidMac, registerSqliteTypes, MAC_TYPE, IPV4_TYPE
 
 class MacValidator:
     @staticmethod
     def validate(mac):
-        macRegex = '^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$'
-        return bool(re.match(macRegex, mac))
+        return isValidMac(mac)
 
 class Networker:
-    def __init__(self):
-        self.arpCache = None
+    def __init__(self, config=None, databasePath=None, Transport=None):
+        self.config = config or Config()
+        self.fresh = False
+
+        # Native backend only: the packet transport class, PacketTransport unless one is injected
+        self.Transport = Transport
+
+        self.scanCache = None
+        if databasePath:
+            cacheConfig = self.config.get('scanCache')
+            self.scanCache = ScanCache(databasePath, cacheConfig['ttl'], cacheConfig['maxEntries'],
+                                       self.config.get('database', 'busyTimeout'))
 
     def getArp(self):
-        if self.arpCache:
-            output = self.arpCache
-            self.__resetCache()
-            return output
-        else:
-            return self.__arp()
+        # Every call scans (or reads the shared scan cache), so a long-lived caller never gets a stale sweep back
+        return self.__scan()
 
-    @staticmethod
-    def getUncachedArp():
-        arpScanResult = subprocess.run(
-            ['sudo', 'arp-scan', '-l', '-q'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE).stdout.decode()
+    def getUncachedArp(self):
+        return self.__scan()
 
-        convertedArpScanResult = Networker.__convertToDict(arpScanResult)
+    def getTargets(self): # -> [{'interface': x, 'cidr': x}]
+        targets = self.config.get('scanner', 'targets')
+        if targets:
+            return targets
 
-        return convertedArpScanResult
+        return [{'interface': self.config.get('scanner', 'interface'), 'cidr': None}]
 
-    def __arp(self):
-        arpScanResult = subprocess.run(
-            ['sudo', 'arp-scan', '-l', '-q'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE).stdout.decode()
+    def __scan(self):
+        targets = self.getTargets()
 
-        self.arpCache = Networker.__convertToDict(arpScanResult)
+        with metrics.span('scan'):
+            if self.scanCache is not None and self.scanCache.isEnabled():
+                targetResults = self.__scanThroughCache(targets)
+            else:
+                targetResults = self.__scanTargets(targets)
 
-        return self.arpCache
-    
-    @staticmethod
-    def __convertToDict(arpInput):
-        arpLines = arpInput.splitlines()
-        pattern = r'(?P<ip>192\.168\.\d+\.\d+)\s+(?P<mac>[0-9a-fA-F:]{17})'
+        merged = {}
+        for target, arpResult in zip(targets, targetResults):
+            interface = target.get('interface')
+            for arpDict in arpResult:
+                arpDict['interface'] = interface
+                merged[(interface, arpDict['mac'])] = arpDict
+
+        return list(merged.values())
 
-        arpOutput = []
-        for line in arpLines:
-            regexResult = re.search(pattern, line)
+    def __scanThroughCache(self, targets):
+        backend = self.config.get('scanner', 'backend')
+        keys = [ScanCache.getKey(backend, target) for target in targets]
 
-            if regexResult:
-                ip = regexResult.group('ip')
-                mac = regexResult.group('mac')
+        targetResults = [None if self.fresh else self.scanCache.get(key) for key in keys]
+        if None not in targetResults:
+            return targetResults
 
-                arpOutput.append({'ip': ip, 'mac': mac})
+        with self.scanCache.lock():
+            # Whoever held the lock before us may just have scanned the same segments
+            if not self.fresh:
+                targetResults = [arpResult if arpResult is not None else self.scanCache.get(key)
+                                 for arpResult, key in zip(targetResults, keys)]
 
-        return arpOutput
+            missing = [index for index, arpResult in enumerate(targetResults) if arpResult is None]
+            scannedResults = self.__scanTargets([targets[index] for index in missing])
 
-    def __resetCache(self):
-        self.arpCache = None
+            for index, arpResult in zip(missing, scannedResults):
+                targetResults[index] = arpResult
+                if arpResult:
+                    self.scanCache.put(keys[index], arpResult)
+
+        return targetResults
+
+    def __scanTargets(self, targets): # -> [[{'ip': x, 'mac': x}], ...] in target order
+        if not targets:
+            return []
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        workers = max(1, min(self.config.get('scanner', 'workers'), len(targets)))
+
+        # Segments are scanned concurrently, so a sweep takes about as long as the slowest one
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.__scanTarget, targets))
+
+    def __scanTarget(self, target):
+        if self.config.get('scanner', 'backend') == 'native':
+            return self.__nativeScan(target)
+
+        import subprocess
+
+        command = ['sudo', 'arp-scan', '-q']
+        if target.get('interface'):
+            command += ['-I', target['interface']]
+        command += [target['cidr']] if target.get('cidr') else ['-l']
+
+        arpScan = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+
+        # As with the native backend, a failed scan raises rather than returning [] and taking every host offline
+        if arpScan.returncode != 0:
+            error = arpScan.stderr.decode(errors='replace').strip() or f'exit status {arpScan.returncode}'
+            raise OSError(f'arp-scan failed: {error}')
+
+        with metrics.span('parse'):
+            return arpparser.parse(arpScan.stdout)
+
+    def __nativeScan(self, target):
+        import ipaddress
+        from arpscanner import ArpScanner, PacketTransport
+
+        scannerConfig = self.config.get('scanner')
+
+        # A socket that cannot be opened (no CAP_NET_RAW, a bad interface) raises rather than
+        # returning [], which the update would take for a network with every host offline
+        transport = (self.Transport or PacketTransport)(target.get('interface'))
+
+        try:
+            scanner = ArpScanner(transport, scannerConfig['rate'], scannerConfig['retries'], scannerConfig['timeout'])
+            hosts = ipaddress.IPv4Network(target['cidr'], strict=False).hosts() if target.get('cidr') else None
+            return scanner.scan(hosts)
+        finally:
+            transport.close()
 
 class Table():
     def __init__(self, tableName, isKnownTable, cursor, connection):
@@ -74,24 +149,58 @@ class Table():
         self.cursor = cursor
         self.connection = connection
 
-    def getAllEntry(self): # None -> [{'x': x}, {'x', x}]
+        self.historyTableName = f'{tableName}History'
+        self.columns = None
+
+        self.macSet = None
+        self.macSetChanges = None
+
+    def getAllEntry(self): # None -> [Row, Row]
         self.cursor.execute(f"SELECT * FROM {self.tableName}")
         entries = self.cursor.fetchall()
 
         return entries
 
+    def iterEntries(self, chunkSize=1000): # None -> Row, Row, ...
+        # Own cursor, so callers can keep querying through self.cursor while iterating
+        cursor = self.connection.execute(f"SELECT * FROM {self.tableName}")
+        while True:
+            with metrics.span('load'):
+                entries = cursor.fetchmany(chunkSize)
+            if not entries:
+                break
+            yield from entries
+
+    def getColumns(self): # None -> ['id', 'mac', ...]
+        if self.columns is None:
+            self.columns = [row['name'] for row in self.connection.execute(f"PRAGMA table_info({self.tableName})")]
+        return self.columns
+
     def getAllList(self, column):  # ip | mac | name -> ['x', 'x']
-        outputList = []
-        for columnItem in self.getAllEntry():
-            if column in columnItem:
-                outputList.append(columnItem[column])
-            else:
-                raise KeyError(f"Column '{column}' does not exist in table '{self.tableName}' entries.")
-        return outputList
+        if column not in self.getColumns():
+            raise KeyError(f"Column '{column}' does not exist in table '{self.tableName}' entries.")
+
+        self.cursor.execute(f"SELECT {column} FROM {self.tableName}")
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def getMacSet(self): # None -> {'x', 'x'}
+        # Any write on this connection, including rolled back or partial batches, bumps total_changes,
+        # and a commit by any other connection bumps data_version; either invalidates the set, so
+        # long-lived processes (serve, the daemon, the GUI) see rows written by other invocations
+        changes = (self.connection.total_changes, self.connection.execute('PRAGMA data_version').fetchone()[0])
+        if self.macSet is None or self.macSetChanges != changes:
+            with metrics.span('load'):
+                self.macSet = set(self.getAllList('mac'))
+            self.macSetChanges = changes
+
+        return self.macSet
+
+    def invalidateMacSet(self) -> None:
+        self.macSet = None
 
     def getEntryByColumn(self, column, value):
         try:
-            self.cursor.execute(f"SELECT * FROM {self.tableName} WHERE {column}=?", (value,))
+            self.cursor.execute(f"SELECT * FROM {self.tableName} WHERE {column}=?", (adapt(column, value),))
             entry = self.cursor.fetchone()
 
             return entry
@@ -99,9 +208,89 @@ class Table():
         except Exception as e:
             print(f"Error in deleteRowByColumn: {e}")
 
-    def select(self):
-        entries = self.getAllEntry()
-        print(tabulate(entries))
+    def getEntriesByMacs(self, macs, chunkSize=500): # ['x', 'x'] -> [{'x': x}, {'x', x}]
+        entries = []
+        with metrics.span('load'):
+            for start in range(0, len(macs), chunkSize):
+                chunk = [adapt('mac', mac) for mac in macs[start:start + chunkSize]]
+                placeholders = ', '.join('?' * len(chunk))
+                self.cursor.execute(f"SELECT * FROM {self.tableName} WHERE mac IN ({placeholders})", chunk)
+                entries.extend(self.cursor.fetchall())
+
+        return entries
+
+    def buildSelect(self, columns=None, where=None, limit=None, offset=None, afterId=None): # -> (sql, params)
+        # Column names end up in the SQL text, so only the table's own columns are accepted
+        columns = columns or self.getColumns()
+        where = where or []
+        for column in list(columns) + [column for column, _ in where]:
+            if column not in self.getColumns():
+                raise KeyError(f"Column '{column}' does not exist in table '{self.tableName}' entries.")
+
+        conditions = [f'{column}=?' for column, _ in where]
+        params = [adapt(column, value) for column, value in where]
+
+        # Keyset pagination: 'id > x' is an index seek, where OFFSET would step over every skipped row
+        if afterId is not None:
+            conditions.append('id > ?')
+            params.append(afterId)
+
+        sql = f"SELECT {', '.join(columns)} FROM {self.tableName}"
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+
+        if limit is not None or offset or afterId is not None:
+            sql += ' ORDER BY id LIMIT ? OFFSET ?'
+            params += [-1 if limit is None else limit, offset or 0]
+
+        return sql, params
+
+    def getColumnWidths(self, sql, params, columns): # -> [int] widest value of each column in the selection
+        # mac and ip are integers in SQLite, so their text width is fixed rather than measured
+        measured = [column for column in columns if column not in ('mac', 'ip')]
+        widths = {'mac': 17, 'ip': 15}
+
+        if measured:
+            aggregates = ', '.join(f'max(length({column}))' for column in measured)
+            row = self.connection.execute(f'SELECT {aggregates} FROM ({sql})', params).fetchone()
+            widths.update((column, width or 0) for column, width in zip(measured, row))
+
+        return [widths[column] for column in columns]
+
+    def select(self, format='table', columns=None, where=None, limit=None, offset=None, afterId=None, stream=None, chunkSize=1000,
+               ouiIndex=None):
+        if columns is None:
+            # Only the human-readable table gains vendor by default; csv and json keep the table's own
+            # columns whatever is installed, and ask for vendor through --columns
+            columns = self.getColumns() + (['vendor'] if ouiIndex is not None and not self.isKnownTable and format == 'table' else [])
+
+        # vendor is not stored: it is looked up from each row's mac, read back as an extra last column
+        vendor = 'vendor' in columns
+        if vendor and ouiIndex is None:
+            raise KeyError("Column 'vendor' needs an OUI file, see 'oui.sources'")
+
+        queryColumns = [column for column in columns if column != 'vendor']
+        if vendor:
+            columns = queryColumns + ['vendor']
+            queryColumns = queryColumns + ['mac']
+
+        sql, params = self.buildSelect(queryColumns, where, limit, offset, afterId)
+        widths = self.getColumnWidths(sql, params, queryColumns) if format == 'table' else None
+
+        writer = output.WRITERS[format](stream or sys.stdout, columns, widths)
+        writer.begin()
+
+        # Own cursor, and rows are written as each chunk arrives instead of after a fetchall
+        cursor = self.connection.execute(sql, params)
+        while True:
+            entries = cursor.fetchmany(chunkSize)
+            if not entries:
+                break
+            if vendor:
+                entries = [tuple(entry)[:-1] + (ouiIndex.lookup(entry[-1]),) for entry in entries]
+            writer.write(entries)
+
+        writer.end()
 
     def insertRow(self, nameIp, mac) -> None:
         mac = mac.replace(' ', '')
@@ -109,11 +298,12 @@ class Table():
         if MacValidator.validate(mac):
             try:
                 if self.isKnownTable:
-                    self.cursor.execute(f"INSERT INTO {self.tableName} (name, mac) VALUES (?, ?)", (nameIp, mac))
+                    self.cursor.execute(f"INSERT INTO {self.tableName} (name, mac) VALUES (?, ?)", self.adaptRow(nameIp, mac))
                 elif not self.isKnownTable:
-                    self.cursor.execute(f"INSERT INTO {self.tableName} (ip, mac) VALUES (?, ?)", (nameIp, mac))
-    
-                self.connection.commit()
+                    self.cursor.execute(f"INSERT INTO {self.tableName} (ip, mac) VALUES (?, ?)", self.adaptRow(nameIp, mac))
+
+                metrics.count('rows inserted', self.cursor.rowcount)
+                self.commit()
 
             except Exception as e:
                 print(f'Error with MAC address: {mac}')
@@ -124,8 +314,9 @@ class Table():
 
     def updateColumnValueById(self, column: str, value: str, id: int) -> None:
         try:
-            self.cursor.execute(f"UPDATE {self.tableName} SET {column}=? WHERE id=?", (value, id))
-            self.connection.commit()
+            self.cursor.execute(f"UPDATE {self.tableName} SET {column}=? WHERE id=?", (adapt(column, value), id))
+            metrics.count('rows updated', self.cursor.rowcount)
+            self.commit()
 
         except Exception as e:
             print(f'Error when inserting query @updateColumnValueById: {e}') 
@@ -137,8 +328,10 @@ class Table():
                     print("Invalid MAC Address")
                     return 0
 
-            self.cursor.execute(f"UPDATE {self.tableName} SET {column}=? WHERE {whereColumn}=?", (value, whereValue))
-            self.connection.commit()
+            self.cursor.execute(f"UPDATE {self.tableName} SET {column}=? WHERE {whereColumn}=?",
+                                (adapt(column, value), adapt(whereColumn, whereValue)))
+            metrics.count('rows updated', self.cursor.rowcount)
+            self.commit()
 
         except Exception as e:
             print(f'Error when inserting query @updateColumnValueById: {e}') 
@@ -148,101 +341,366 @@ class Table():
     
     def deleteRowByColumn(self, column, value) -> None:
         try:
-            self.cursor.execute(f"DELETE FROM {self.tableName} WHERE {column}=?", (value,))
-            self.connection.commit()
+            self.cursor.execute(f"DELETE FROM {self.tableName} WHERE {column}=?", (adapt(column, value),))
+            metrics.count('rows deleted', self.cursor.rowcount)
+            self.commit()
         except Exception as e:
             print(f"Error in deleteRowByColumn: {e}")
 
+    def deleteRowsOlderThan(self, cutoff) -> None:
+        try:
+            self.cursor.execute(f"DELETE FROM {self.tableName} WHERE time < ?", (cutoff,))
+            metrics.count('rows deleted', self.cursor.rowcount)
+            self.commit()
+        except Exception as e:
+            self.handleError('Error in deleteRowsOlderThan', e)
+
+    def archiveRowsOlderThan(self, cutoff, bucketFormat) -> None:
+        # One history row per MAC and time bucket, keeping the latest ip seen in that bucket
+        try:
+            self.cursor.execute(f'''INSERT INTO {self.historyTableName} (mac, ip, lastSeen, bucket)
+                SELECT mac, ip, time, strftime(?, time) FROM {self.tableName} WHERE time < ?
+                ON CONFLICT(mac, bucket) DO UPDATE SET
+                    ip = CASE WHEN excluded.lastSeen >= lastSeen THEN excluded.ip ELSE ip END,
+                    lastSeen = max(lastSeen, excluded.lastSeen)''', (bucketFormat, cutoff))
+            metrics.count('rows archived', self.cursor.rowcount)
+            self.commit()
+        except Exception as e:
+            self.handleError('Error in archiveRowsOlderThan', e)
+
+    def deleteArchivedBucketsBefore(self, bucket) -> None:
+        try:
+            self.cursor.execute(f"DELETE FROM {self.historyTableName} WHERE bucket < ?", (bucket,))
+            metrics.count('rows deleted', self.cursor.rowcount)
+            self.commit()
+        except Exception as e:
+            self.handleError('Error in deleteArchivedBucketsBefore', e)
+
+    def adaptRow(self, nameIp, mac): # -> (name | IPv4Address, MacAddress)
+        return (nameIp if self.isKnownTable else adapt('ip', nameIp)), adapt('mac', mac)
+
+    def transaction(self):
+        return self.connection.transaction()
+
+    def handleError(self, message, error) -> None:
+        # Inside a transaction() block a failed write must reach the context manager, which rolls
+        # the whole batch back instead of committing whatever ran before the error
+        if self.connection.batchDepth:
+            raise error
+        print(f'{message}: {error}')
+
+    def commit(self) -> None:
+        self.invalidateMacSet()
+
+        # Inside a transaction() block the outermost block commits once on exit
+        if not self.connection.batchDepth:
+            self.connection.commit()
+
+    def upsertRows(self, rows) -> None: # [(nameIp, mac)]
+        try:
+            validRows = [self.adaptRow(nameIp, mac) for nameIp, mac in rows if MacValidator.validate(mac)]
+
+            if self.isKnownTable:
+                self.cursor.executemany(f'''INSERT INTO {self.tableName} (name, mac) VALUES (?, ?)
+                    ON CONFLICT(mac) DO UPDATE SET name=excluded.name''', validRows)
+            else:
+                newTime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                self.cursor.executemany(f'''INSERT INTO {self.tableName} (ip, mac, time) VALUES (?, ?, ?)
+                    ON CONFLICT(mac) DO UPDATE SET ip=excluded.ip, time=excluded.time''',
+                    [(ip, mac, newTime) for ip, mac in validRows])
+            metrics.count('rows upserted', self.cursor.rowcount)
+            self.commit()
+
+        except Exception as e:
+            self.handleError('Error when inserting query @upsertRows', e)
+
+    def importRows(self, columns, rows, policy='skip') -> None: # ['name', 'mac', ...], [(value, ...)] already adapted
+        # On an existing MAC: skip keeps the row, replace overwrites the imported columns and
+        # merge only fills in the imported values that are not NULL. The id is kept either way.
+        updates = [column for column in columns if column != 'mac']
+        if policy == 'skip' or not updates:
+            conflict = 'DO NOTHING'
+        elif policy == 'replace':
+            conflict = 'DO UPDATE SET ' + ', '.join(f'{column}=excluded.{column}' for column in updates)
+        else:
+            conflict = 'DO UPDATE SET ' + ', '.join(f'{column}=coalesce(excluded.{column}, {column})' for column in updates)
+
+        # Errors propagate, so the caller's transaction rolls the whole import back
+        self.cursor.executemany(f"INSERT INTO {self.tableName} ({', '.join(columns)}) "
+                                f"VALUES ({', '.join('?' * len(columns))}) ON CONFLICT(mac) {conflict}", rows)
+        metrics.count('rows upserted', self.cursor.rowcount)
+        self.commit()
+
+    def updateColumnValuesById(self, column, rows) -> None: # [(value, id)]
+        try:
+            self.cursor.executemany(f"UPDATE {self.tableName} SET {column}=? WHERE id=?",
+                                    [(adapt(column, value), id) for value, id in rows])
+            metrics.count('rows updated', self.cursor.rowcount)
+            self.commit()
+
+        except Exception as e:
+            self.handleError('Error when inserting query @updateColumnValuesById', e)
+
+    def deleteRowsByMac(self, macs) -> None:
+        try:
+            self.cursor.executemany(f"DELETE FROM {self.tableName} WHERE mac=?", [(adapt('mac', mac),) for mac in macs])
+            metrics.count('rows deleted', self.cursor.rowcount)
+            self.commit()
+
+        except Exception as e:
+            self.handleError('Error in deleteRowsByMac', e)
+
 class TableUpdater:
-    def __init__(self, knownTable, unknownTable, networker):
+    BUCKET_FORMATS = {'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d'}
+
+    def __init__(self, knownTable, unknownTable, networker, config=None):
         self.knownEntry = knownTable
         self.unknownEntry = unknownTable
         self.networker = networker
 
-    def update(self) -> None:
-        self.updateKnownEntry()
-        self.updateUnknownEntry()
+        config = config or Config()
+        self.expiry = config.get('expiry')
 
-    def updateKnownEntry(self) -> None:
-        knownEntries = self.knownEntry.getAllEntry()
-        arpResult = self.networker.getArp()
-        
-        for knownEntry in knownEntries:
-            macFound = False
-            for arpDict in arpResult:
-                if knownEntry['mac'] == arpDict['mac']:
-                    macFound = True
-                    
-                    self.knownEntry.updateColumnValueById('ip', arpDict['ip'], knownEntry['id'])
+        self.history = None
+        if config.get('history', 'enabled'):
+            self.history = PresenceHistory(knownTable.connection, config.get('history'))
 
-            if not macFound:
-                self.knownEntry.updateColumnValueById('ip', 'NULL', knownEntry['id'])
+        # The event dispatcher and its thread only start once there is something to publish
+        self.eventsConfig = config.get('events')
+        self.events = None
+        self.flapDetector = None
 
-    def updateUnknownEntry(self) -> None:
-        knownEntriesMacList = self.knownEntry.getAllList('mac')
-        unknownEntriesMacList = self.unknownEntry.getAllList('mac')
-        arpResult = self.networker.getArp()
+        # Per-scan events also go to a multi-site aggregator when 'collector.address' is set
+        self.collectorConfig = config.get('collector')
+        self.pusher = None
 
-        for arpDict in arpResult:
-            arpMac = arpDict['mac']
-            if arpMac not in knownEntriesMacList:
-                if arpMac not in unknownEntriesMacList:
-                    self.unknownEntry.insertRow(arpDict['ip'], arpDict['mac'])
-                elif arpMac in unknownEntriesMacList:
-                    newTime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    self.unknownEntry.updateColumnValueById('time', newTime, self.unknownEntry.getEntryByColumn('mac', arpMac)['id'])
+    def update(self, known=True, unknown=True, arpResult=None, expire=False) -> None:
+        # The scan runs before the transaction so no write lock is held while waiting on the network
+        if arpResult is None:
+            arpResult = self.networker.getArp()
+
+        with self.transaction():
+            if expire:
+                self.deleteOldUnknownEntry()
+
+            unknownEntries = self.unknownEntry.iterEntries()
+
+            # Tables are streamed into the reconciler, so 'reconcile' includes the 'load' time of the reads
+            with metrics.span('reconcile'):
+                if known:
+                    delta = Reconciler.reconcile(self.knownEntry.iterEntries(), unknownEntries, arpResult)
+                else:
+                    delta = Reconciler.reconcileUnknown(self.knownEntry.getMacSet(), unknownEntries, arpResult)
+
+            self.applyDelta(delta, known, unknown)
+            self.recordHistory(arpResult)
+
+        self.publishEvents(delta, known, unknown)
+        self.rollupHistory()
+
+    def updateObserved(self, arpResult) -> None:
+        # Partial update for passively observed hosts: only their rows are read and nobody goes offline
+        macs = [arpDict['mac'] for arpDict in arpResult]
+        knownEntries = self.knownEntry.getEntriesByMacs(macs)
+        unknownEntries = self.unknownEntry.getEntriesByMacs(macs)
+
+        with metrics.span('reconcile'):
+            delta = Reconciler.reconcile(knownEntries, unknownEntries, arpResult, partial=True)
+
+        with self.transaction():
+            self.applyDelta(delta)
+            self.recordHistory(arpResult)
+
+        self.publishEvents(delta)
+        self.rollupHistory()
+
+    def updateKnownEntry(self, expire=False) -> None:
+        self.update(unknown=False, expire=expire)
+
+    def updateUnknownEntry(self, expire=False) -> None:
+        self.update(known=False, expire=expire)
+
+    def transaction(self):
+        return self.knownEntry.transaction()
+
+    def recordHistory(self, arpResult) -> None:
+        if self.history is not None:
+            with metrics.span('history'):
+                self.history.record(arpResult)
+
+    def rollupHistory(self) -> None:
+        if self.history is not None:
+            with metrics.span('history'):
+                self.history.rollup()
+
+    def publishEvents(self, delta, known=True, unknown=True) -> None:
+        # Only called once the delta is committed, so sinks and the aggregator never see a change that was rolled back
+        if not self.eventsConfig['sinks'] and not self.collectorConfig['address']:
+            return
+
+        from events import EventDispatcher, FlapDetector, eventsFromDelta
+
+        if self.events is None and self.eventsConfig['sinks']:
+            self.events = EventDispatcher.fromConfig(self.eventsConfig)
+            if self.events is None:
+                self.eventsConfig = dict(self.eventsConfig, sinks=[])
+
+        if self.pusher is None and self.collectorConfig['address']:
+            from collector import DeltaPusher
+            self.pusher = DeltaPusher(self.collectorConfig, self.knownEntry.connection)
+
+        if self.flapDetector is None:
+            self.flapDetector = FlapDetector(self.eventsConfig['flapWindow'], self.eventsConfig['flapThreshold'], self.knownEntry.connection)
+
+        # The flap history of all of the scan's ip changes is written in one transaction
+        with self.transaction():
+            events = eventsFromDelta(delta, known, unknown, self.flapDetector)
+
+        if self.events is not None:
+            self.events.publish(events)
+
+        if self.pusher is not None:
+            self.pusher.push(events)
+
+    def close(self) -> None:
+        if self.events is not None:
+            self.events.close()
+            self.events = None
+
+    def applyDelta(self, delta, known=True, unknown=True) -> None:
+        with metrics.span('write'):
+            self.__applyDelta(delta, known, unknown)
+
+    def __applyDelta(self, delta, known, unknown) -> None:
+        if known:
+            self.knownEntry.updateColumnValuesById('ip', delta.ipChanges)
+            self.knownEntry.updateColumnValuesById('ip', [(Reconciler.OFFLINE_IP, id) for id in delta.wentOffline])
+
+        if unknown:
+            # Upserted, as another writer (daemon, GUI, a second CLI run) may have added the MAC since it was read
+            self.unknownEntry.upsertRows(delta.inserts)
 
-        self.deleteDuplicateEntry()
+            newTime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.unknownEntry.updateColumnValuesById('time', [(newTime, id) for id in delta.refreshes])
+
+            self.unknownEntry.deleteRowsByMac(delta.promotions)
 
     def deleteDuplicateEntry(self) -> None:
-        knownEntriesMacList = self.knownEntry.getAllList('mac')
-        unknownEntriesMacList = self.unknownEntry.getAllList('mac')
+        knownEntriesMacSet = self.knownEntry.getMacSet()
 
-        for unknownMac in unknownEntriesMacList:
-            if unknownMac in knownEntriesMacList:
-                self.unknownEntry.deleteRowByColumn('mac', unknownMac)
+        duplicateMacs = [mac for mac in self.unknownEntry.getMacSet() if mac in knownEntriesMacSet]
+        self.unknownEntry.deleteRowsByMac(duplicateMacs)
 
     def deleteOldUnknownEntry(self) -> None:
-        unknownEntryList = self.unknownEntry.getAllEntry()
+        # Times are stored as sortable '%Y-%m-%d %H:%M:%S' text, so expiry is one range delete on the time index
+        currentTime = datetime.now()
+        cutoff = (currentTime - timedelta(seconds=self.expiry['unknownTtl'])).strftime('%Y-%m-%d %H:%M:%S')
+
+        with metrics.span('expire'), self.transaction():
+            if self.expiry['policy'] == 'archive':
+                bucketFormat = TableUpdater.BUCKET_FORMATS[self.expiry['bucket']]
+                self.unknownEntry.archiveRowsOlderThan(cutoff, bucketFormat)
 
-        for unknownEntryDict in unknownEntryList:
-            
-            unknownEntryTime = datetime.strptime(unknownEntryDict['time'], "%Y-%m-%d %H:%M:%S")
-            currentTime = datetime.now()
-            timeDelta = timedelta(days=2)
+                if self.expiry['archiveRetention']:
+                    archiveCutoff = currentTime - timedelta(seconds=self.expiry['archiveRetention'])
+                    self.unknownEntry.deleteArchivedBucketsBefore(archiveCutoff.strftime(bucketFormat))
 
-            if unknownEntryTime < currentTime - timeDelta: # unknown entry was made more than timeDelta minutes ago
-                self.unknownEntry.deleteRowByColumn('id', unknownEntryDict['id'])
+            self.unknownEntry.deleteRowsOlderThan(cutoff)
 
 class NetworkInfo:
-    def __init__(self, knownTable, unknownTable):
+    def __init__(self, knownTable, unknownTable, networker, ouiIndex=None):
         self.knownTable = knownTable
         self.unknownTable = unknownTable
+        self.networker = networker
+        self.ouiIndex = ouiIndex
 
     def getNotDatabaseEntry(self):
-        arpResult = Networker.getUncachedArp()
+        arpResult = self.networker.getUncachedArp()
+        knownMacs = self.knownTable.getMacSet()
+        unknownMacs = self.unknownTable.getMacSet()
 
         for arpDict in arpResult:
             arpMac = arpDict['mac']
 
-            if arpMac not in self.knownTable.getAllList('mac') and arpMac not in self.unknownTable.getAllList('mac'):
+            if arpMac not in knownMacs and arpMac not in unknownMacs:
+                if self.ouiIndex is not None:
+                    arpDict = dict(arpDict, vendor=self.ouiIndex.lookup(arpMac))
                 print(arpDict)
 
+class Connection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batchDepth = 0
+
+    def commit(self):
+        with metrics.span('commit'):
+            super().commit()
+
+    @contextmanager
+    def transaction(self):
+        self.batchDepth += 1
+        try:
+            yield self
+        except BaseException:
+            self.batchDepth -= 1
+            if not self.batchDepth:
+                self.rollback()
+            raise
+        else:
+            self.batchDepth -= 1
+            if not self.batchDepth:
+                self.commit()
+
 class Database:
-    def __init__(self, databasePath, knownTableName, unknownTableName):
-        self.connection = sqlite3.connect(databasePath)
-        self.connection.row_factory = self.dict_factory
+    SCHEMA_VERSION = 8
+
+    def __init__(self, databasePath, knownTableName, unknownTableName, profile=None):
+        profile = profile or Config().get('database')
+
+        self.databasePath = databasePath
+
+        registerSqliteTypes()
+        self.connection = sqlite3.connect(
+            databasePath,
+            timeout=profile['busyTimeout'],
+            factory=Connection,
+            detect_types=sqlite3.PARSE_DECLTYPES)
+        self.connection.row_factory = sqlite3.Row
         self.cursor = self.connection.cursor()
+        self.applyProfile(profile)
 
         self.knownTableName = knownTableName
         self.unknownTableName = unknownTableName
 
-    def dict_factory(self, cursor, row):
-        return {cursor.description[i][0]: row[i] for i in range(len(row))}
+        self.migrations = {
+            1: self.__createTablesV1,
+            2: self.__migrateToIntegerAddresses,
+            3: self.__createLookupIndexes,
+            4: self.__createHistoryTable,
+            5: self.__createScanCacheTable,
+            6: lambda: PresenceHistory.createTables(self.cursor),
+            7: self.__createCollectorBacklogTable,
+            8: self.__createFlapChangesTable,
+        }
+
+    def applyProfile(self, profile) -> None:
+        # The 'default' profile leaves SQLite's own settings alone
+        if profile['profile'] != 'tuned':
+            return
+
+        # WAL lets the daemon, the GUI and CLI readers work alongside a writer without "database is locked"
+        self.cursor.execute(f"PRAGMA journal_mode = {profile['journalMode']}")
+        self.cursor.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+        self.cursor.execute(f"PRAGMA mmap_size = {int(profile['mmapSize'])}")
+        self.cursor.execute(f"PRAGMA cache_size = {int(profile['cacheSize'])}")
+        self.cursor.execute(f"PRAGMA temp_store = {profile['tempStore']}")
 
     def getCursor(self):
         return self.cursor
 
+    def getDatabasePath(self):
+        return self.databasePath
+
     def getConnection(self):
         return self.connection
 
@@ -252,7 +710,26 @@ class Database:
     def getUnknownTableName(self):
         return self.unknownTableName
 
+    def getSchemaVersion(self):
+        return self.connection.execute('PRAGMA user_version').fetchone()['user_version']
+
+    def needsMigration(self):
+        return self.getSchemaVersion() < Database.SCHEMA_VERSION
+
     def createTables(self):
+        # Databases created before versioning have user_version 0; the v1 step is a no-op for them
+        for version in range(self.getSchemaVersion() + 1, Database.SCHEMA_VERSION + 1):
+            self.cursor.execute('BEGIN')
+            try:
+                self.migrations[version]()
+                self.cursor.execute(f'PRAGMA user_version = {version}')
+                self.connection.commit()
+
+            except Exception:
+                self.connection.rollback()
+                raise
+
+    def __createTablesV1(self):
         self.cursor.execute(f'''CREATE TABLE IF NOT EXISTS {self.knownTableName} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
@@ -268,14 +745,110 @@ class Database:
             time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )''')
 
-        self.connection.commit()
+    def __migrateToIntegerAddresses(self):
+        # mac and ip become 48/32-bit integers; time is declared TEXT so it is not parsed into datetime
+        self.cursor.execute(f'''CREATE TABLE {self.knownTableName}_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            mac {MAC_TYPE} NOT NULL UNIQUE,
+            ip {IPV4_TYPE},
+            time TEXT DEFAULT CURRENT_TIMESTAMP
+        )''')
+
+        self.cursor.execute(f'''CREATE TABLE {self.unknownTableName}_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip {IPV4_TYPE} NOT NULL,
+            mac {MAC_TYPE} NOT NULL UNIQUE,
+            time TEXT DEFAULT CURRENT_TIMESTAMP
+        )''')
+
+        self.__copyRows(self.knownTableName, ('id', 'name', 'mac', 'ip', 'time'))
+        self.__copyRows(self.unknownTableName, ('id', 'ip', 'mac', 'time'))
+
+        for tableName in (self.knownTableName, self.unknownTableName):
+            self.cursor.execute(f'DROP TABLE {tableName}')
+            self.cursor.execute(f'ALTER TABLE {tableName}_v2 RENAME TO {tableName}')
+
+    def __createLookupIndexes(self):
+        for tableName in (self.knownTableName, self.unknownTableName):
+            self.cursor.execute(f'CREATE INDEX IF NOT EXISTS {tableName}_time ON {tableName} (time)')
+            self.cursor.execute(f'CREATE INDEX IF NOT EXISTS {tableName}_ip ON {tableName} (ip)')
+
+    def __createHistoryTable(self):
+        self.cursor.execute(f'''CREATE TABLE IF NOT EXISTS {self.unknownTableName}History (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mac {MAC_TYPE} NOT NULL,
+            ip {IPV4_TYPE},
+            lastSeen TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            UNIQUE (mac, bucket)
+        )''')
+        self.cursor.execute(f'''CREATE INDEX IF NOT EXISTS {self.unknownTableName}History_bucket
+            ON {self.unknownTableName}History (bucket)''')
+
+    def __createScanCacheTable(self):
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS scanCache (
+            target TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            scannedAt REAL NOT NULL,
+            lastUsed REAL NOT NULL
+        )''')
+
+    def __createCollectorBacklogTable(self):
+        # Event batches waiting for the aggregator, kept across invocations (see collector.DeltaPusher)
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS collectorBacklog (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            batch TEXT NOT NULL
+        )''')
+
+    def __createFlapChangesTable(self):
+        # ip change times of known hosts within 'events.flapWindow' (see events.FlapDetector)
+        self.cursor.execute(f'''CREATE TABLE IF NOT EXISTS flapChanges (
+            mac {MAC_TYPE} NOT NULL,
+            time REAL NOT NULL
+        )''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS flapChanges_mac ON flapChanges (mac)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS flapChanges_time ON flapChanges (time)')
+
+    def __copyRows(self, tableName, columns):
+        rows = self.connection.execute(f'SELECT {", ".join(columns)} FROM {tableName} ORDER BY id').fetchall()
+
+        convertedRows = []
+        firstIds = {} # mac -> id of the row kept for it
+        for row in rows:
+            try:
+                # The old known table used the string 'NULL' for hosts that were offline
+                convertedRow = tuple(adapt(column, None if column == 'ip' and row[column] == 'NULL' else row[column])
+                                     for column in columns)
+            except ValueError as e:
+                print(f'Skipping row {row["id"]} of {tableName} during migration: {e}')
+                continue
+
+            # MACs that only differed in case or separator now collide; the oldest row wins
+            mac = convertedRow[columns.index('mac')]
+            if mac in firstIds:
+                print(f'Skipping row {row["id"]} of {tableName} during migration: '
+                      f'MAC {row["mac"]} is a duplicate of row {firstIds[mac]}')
+                continue
+
+            firstIds[mac] = row['id']
+            convertedRows.append(convertedRow)
+
+        self.cursor.executemany(f'''INSERT INTO {tableName}_v2 ({", ".join(columns)})
+            VALUES ({", ".join("?" * len(columns))})''', convertedRows)
 
 def main():
+    config = Config.load(os.path.join(os.path.dirname(__file__), 'arpmanager.json'))
     databasePath = os.path.join(os.path.dirname(__file__), 'arp.db')
-    database = Database(databasePath, 'knownEntries', 'unknownEntries')
-    database.createTables()
 
-    commandDispatcher = CommandDispatcher(database, Table, Networker, TableUpdater, NetworkInfo)
+    def openDatabase():
+        database = Database(databasePath, 'knownEntries', 'unknownEntries', config.get('database'))
+        if database.needsMigration():
+            database.createTables()
+        return database
+
+    # The database is only opened by commands that use it
+    commandDispatcher = CommandDispatcher(openDatabase, config, Table, Networker, TableUpdater, NetworkInfo)
     commandDispatcher.dispatch()
 
 if __name__ == '__main__':
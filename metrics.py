@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# Stage timings and counters for the hot path. Everything is a no-op until enable() is called,
+# so instrumented code pays one attribute check per span when profiling is off.
+
+NULL_SPAN = nullcontext()
+
+class Registry:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.spans = {}     # name -> [calls, seconds], in the order stages first ran
+        self.counters = {}  # name -> value
+
+class Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        # Scans run on worker threads, so spans of the same stage can finish concurrently
+        with REGISTRY.lock:
+            span = REGISTRY.spans.setdefault(self.name, [0, 0.0])
+            span[0] += 1
+            span[1] += elapsed
+
+REGISTRY = Registry()
+
+def enable() -> None:
+    REGISTRY.enabled = True
+
+def isEnabled() -> bool:
+    return REGISTRY.enabled
+
+def span(name):
+    if not REGISTRY.enabled:
+        return NULL_SPAN
+    return Span(name)
+
+def count(name, amount=1) -> None:
+    if not REGISTRY.enabled or amount <= 0:
+        return
+
+    with REGISTRY.lock:
+        REGISTRY.counters[name] = REGISTRY.counters.get(name, 0) + amount
+
+def traceStatements(connection) -> None:
+    # SQLite calls this once per executed statement, executemany rows included
+    connection.set_trace_callback(lambda statement: count('sql statements'))
+
+def report(): # -> str
+    with REGISTRY.lock:
+        spans = dict(REGISTRY.spans)
+        counters = dict(REGISTRY.counters)
+
+    lines = [f"{'stage':>12} {'calls':>8} {'seconds':>10}"]
+    lines += [f'{name:>12} {calls:>8} {seconds:>10.4f}' for name, (calls, seconds) in spans.items()]
+    lines.append('')
+    lines += [f'{name:>21} {value:>8}' for name, value in counters.items()]
+    return '\n'.join(lines)
+
+def toPrometheus(): # -> str in the Prometheus text exposition format
+    with REGISTRY.lock:
+        spans = dict(REGISTRY.spans)
+        counters = dict(REGISTRY.counters)
+
+    lines = ['# HELP arpmanager_stage_seconds_total Time spent in each stage.',
+             '# TYPE arpmanager_stage_seconds_total counter']
+    lines += [f'arpmanager_stage_seconds_total{{stage="{name}"}} {seconds:.6f}' for name, (_, seconds) in spans.items()]
+    lines += ['# HELP arpmanager_stage_calls_total Times each stage ran.',
+              '# TYPE arpmanager_stage_calls_total counter']
+    lines += [f'arpmanager_stage_calls_total{{stage="{name}"}} {calls}' for name, (calls, _) in spans.items()]
+
+    for name, value in counters.items():
+        metricName = f"arpmanager_{name.replace(' ', '_')}_total"
+        lines += [f'# TYPE {metricName} counter', f'{metricName} {value}']
+
+    return '\n'.join(lines) + '\n'
+
+def writeTextfile(path) -> None:
+    # Written next to the target and renamed, so a collector never reads a half-written file
+    temporaryPath = f'{path}.tmp'
+    with open(temporaryPath, 'w') as metricsFile:
+        metricsFile.write(toPrometheus())
+    os.replace(temporaryPath, path)
+
+class MetricsServer:
+    # Serves /metrics from a background thread, for daemon mode
+    def __init__(self, port, host='127.0.0.1'):
+        # http.server is slow to import, and only daemon mode with 'metrics.port' set needs it
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = toPrometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer', daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
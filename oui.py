@@ -0,0 +1,170 @@
+import bisect
+import csv
+import mmap
+import os
+import re
+import struct
+from functools import lru_cache
+
+from addresses import MacAddress
+
+# Vendor lookup from IEEE OUI assignments. The text registries are compiled once into a binary
+# index that is memory-mapped on use: one sorted array of prefixes per assignment size (MA-S 36,
+# MA-M 28 and MA-L 24 bits), a parallel array of name offsets, then the names. A lookup is a
+# bisect over the mapped arrays, most specific size first, so no CLI call parses the text files.
+
+MAGIC = b'OUI1'
+HEADER = struct.Struct('<4sIII')    # magic, then the entry count of each size in PREFIX_BITS order
+NAME_LENGTH = struct.Struct('<H')
+PREFIX_BITS = (36, 28, 24)
+
+DEFAULT_SOURCES = [
+    '/usr/share/arp-scan/ieee-oui.txt',
+    '/usr/share/ieee-data/oui.csv',
+    '/usr/share/ieee-data/mam.csv',
+    '/usr/share/ieee-data/oui36.csv',
+    '/usr/share/ieee-data/oui.txt',
+]
+
+# 'XX-XX-XX   (hex)\t\tVendor' in oui.txt, 'XXXXXX\tVendor' (6, 7 or 9 digits) in arp-scan's ieee-oui.txt
+HEX_LINE = re.compile(r'^([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})-([0-9A-Fa-f]{2})\s+\(hex\)\s+(.+)$')
+TAB_LINE = re.compile(r'^([0-9A-Fa-f]{6}|[0-9A-Fa-f]{7}|[0-9A-Fa-f]{9})\t+(.+)$')
+
+def parseSource(path): # -> {(bits, prefix): vendor}
+    assignments = {}
+
+    with open(path, encoding='utf-8', errors='replace', newline='') as sourceFile:
+        if path.endswith('.csv'):
+            # IEEE registry CSV: Registry, Assignment, Organization Name, Organization Address
+            for row in csv.reader(sourceFile):
+                if len(row) >= 3 and re.fullmatch(r'[0-9A-Fa-f]{6,9}', row[1]):
+                    assignments[(len(row[1]) * 4, int(row[1], 16))] = row[2].strip()
+            return assignments
+
+        for line in sourceFile:
+            match = HEX_LINE.match(line)
+            if match:
+                assignments[(24, int(''.join(match.group(1, 2, 3)), 16))] = match.group(4).strip()
+                continue
+
+            match = TAB_LINE.match(line)
+            if match:
+                assignments[(len(match.group(1)) * 4, int(match.group(1), 16))] = match.group(2).strip()
+
+    return assignments
+
+def build(sourcePaths, indexPath) -> int: # -> entries written
+    assignments = {}
+    for path in sourcePaths:
+        assignments.update(parseSource(path))
+
+    names = bytearray()
+    nameOffsets = {}
+    levels = []
+    for bits in PREFIX_BITS:
+        entries = sorted((prefix, vendor) for (entryBits, prefix), vendor in assignments.items() if entryBits == bits)
+        offsets = []
+        for _, vendor in entries:
+            # Vendors with many blocks share one copy of their name
+            if vendor not in nameOffsets:
+                encoded = vendor.encode()[:0xffff]
+                nameOffsets[vendor] = len(names)
+                names += NAME_LENGTH.pack(len(encoded)) + encoded
+            offsets.append(nameOffsets[vendor])
+        levels.append(([prefix for prefix, _ in entries], offsets))
+
+    # Written next to the target and renamed, so a concurrent reader never maps a half-written index
+    temporaryPath = f'{indexPath}.tmp'
+    with open(temporaryPath, 'wb') as indexFile:
+        indexFile.write(HEADER.pack(MAGIC, *(len(prefixes) for prefixes, _ in levels)))
+        for prefixes, offsets in levels:
+            # Native byte order, as the arrays are read in place with memoryview.cast on the same machine
+            indexFile.write(struct.pack(f'={len(prefixes)}Q', *prefixes))
+            indexFile.write(struct.pack(f'={len(offsets)}I', *offsets))
+        indexFile.write(names)
+    os.replace(temporaryPath, indexPath)
+
+    return len(assignments)
+
+class OuiIndex:
+    def __init__(self, indexPath, cacheSize=4096):
+        with open(indexPath, 'rb') as indexFile:
+            self.map = mmap.mmap(indexFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, *counts = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f'{indexPath} is not an OUI index')
+
+        # memoryview.cast reads the arrays in place; bisect runs on them in C without copying
+        self.view = memoryview(self.map)
+        self.levels = []
+        offset = HEADER.size
+        for bits, count in zip(PREFIX_BITS, counts):
+            prefixes = self.view[offset:offset + 8 * count].cast('Q')
+            offset += 8 * count
+            nameOffsets = self.view[offset:offset + 4 * count].cast('I')
+            offset += 4 * count
+            self.levels.append((48 - bits, prefixes, nameOffsets))
+        self.namesOffset = offset
+
+        # Hosts on one network share a handful of prefixes, so those are answered from the cache
+        self.lookupPrefix = lru_cache(maxsize=cacheSize)(self.__lookupPrefix)
+
+    def lookup(self, mac): # 'xx:xx:..' | int -> vendor | None
+        if isinstance(mac, str):
+            try:
+                mac = MacAddress.fromString(mac)
+            except ValueError:
+                return None
+
+        # The 36-bit prefix determines every shorter one, so it is the cache key
+        return self.lookupPrefix(mac >> 12)
+
+    def __lookupPrefix(self, prefix36):
+        for shift, prefixes, nameOffsets in self.levels:
+            prefix = (prefix36 << 12) >> shift
+            index = bisect.bisect_left(prefixes, prefix)
+            if index < len(prefixes) and prefixes[index] == prefix:
+                return self.getName(nameOffsets[index])
+        return None
+
+    def getName(self, offset):
+        start = self.namesOffset + offset
+        length, = NAME_LENGTH.unpack_from(self.map, start)
+        return self.map[start + NAME_LENGTH.size:start + NAME_LENGTH.size + length].decode()
+
+    def __len__(self):
+        return sum(len(prefixes) for _, prefixes, _ in self.levels)
+
+    def close(self) -> None:
+        # The casts keep the mmap exported, so they go before it is closed
+        for _, prefixes, nameOffsets in self.levels:
+            prefixes.release()
+            nameOffsets.release()
+        self.levels = []
+        self.view.release()
+        self.map.close()
+
+def findSources(ouiConfig): # -> [path] that exist
+    return [path for path in (ouiConfig['sources'] or DEFAULT_SOURCES) if os.path.exists(path)]
+
+def load(ouiConfig, indexPath): # -> OuiIndex | None
+    # The index is rebuilt only when a source file is newer than it, which costs a few stat calls.
+    # Where the index cannot be written the sources are not parsed at all, as every call would pay
+    # for a build that fails; an existing index is then used as it is and 'oui build' reports the error.
+    sources = findSources(ouiConfig)
+
+    try:
+        indexTime = os.path.getmtime(indexPath) if os.path.exists(indexPath) else None
+        writable = os.access(os.path.dirname(os.path.abspath(indexPath)), os.W_OK)
+        if sources and writable and (indexTime is None or any(os.path.getmtime(path) > indexTime for path in sources)):
+            build(sources, indexPath)
+        elif indexTime is None:
+            return None
+
+        return OuiIndex(indexPath, ouiConfig['cacheSize'])
+
+    except (OSError, ValueError) as e:
+        print(f'Error when loading OUI index {indexPath}: {e}')
+        return None
@@ -0,0 +1,83 @@
+import csv
+import json
+
+# Writers for Table.select. Rows arrive in chunks and are written as they come, so memory stays
+# flat however large the table is.
+
+MISSING = 'NULL'
+
+class TableWriter:
+    # Aligned text columns. Widths are worked out up front (see Table.getColumnWidths), not from the rows
+    def __init__(self, stream, columns, widths):
+        self.stream = stream
+        self.columns = columns
+        self.widths = [max(width, len(column), len(MISSING)) for column, width in zip(columns, widths)]
+
+    def begin(self) -> None:
+        self.__writeLine(self.columns)
+        self.__writeLine(['-' * width for width in self.widths])
+
+    def write(self, rows) -> None:
+        for row in rows:
+            self.__writeLine([MISSING if value is None else str(value) for value in row])
+
+    def end(self) -> None:
+        pass
+
+    def __writeLine(self, values) -> None:
+        self.stream.write('  '.join(value.ljust(width) for value, width in zip(values, self.widths)).rstrip() + '\n')
+
+class CsvWriter:
+    def __init__(self, stream, columns, widths=None):
+        self.writer = csv.writer(stream)
+        self.columns = columns
+
+    def begin(self) -> None:
+        self.writer.writerow(self.columns)
+
+    def write(self, rows) -> None:
+        self.writer.writerows(rows)
+
+    def end(self) -> None:
+        pass
+
+class JsonLinesWriter:
+    # One JSON object per line (JSON Lines / NDJSON)
+    def __init__(self, stream, columns, widths=None):
+        self.stream = stream
+        self.columns = columns
+
+    def begin(self) -> None:
+        pass
+
+    def write(self, rows) -> None:
+        self.stream.write(''.join(json.dumps(dict(zip(self.columns, row)), separators=(',', ':')) + '\n' for row in rows))
+
+    def end(self) -> None:
+        pass
+
+class JsonWriter:
+    # A single JSON array, written element by element
+    def __init__(self, stream, columns, widths=None):
+        self.stream = stream
+        self.columns = columns
+        self.separator = '\n'
+
+    def begin(self) -> None:
+        self.stream.write('[')
+
+    def write(self, rows) -> None:
+        for row in rows:
+            self.stream.write(self.separator + json.dumps(dict(zip(self.columns, row)), separators=(',', ':')))
+            self.separator = ',\n'
+
+    def end(self) -> None:
+        self.stream.write('\n]\n')
+
+WRITERS = {
+    'table': TableWriter,
+    'csv': CsvWriter,
+    'jsonl': JsonLinesWriter,
+    'ndjson': JsonLinesWriter,
+    'json': JsonWriter,
+}
@@ -0,0 +1,116 @@
+class ScanDelta:
+    def __init__(self):
+        self.inserts = []       # [(ip, mac)] new unknown devices
+        self.refreshes = []     # [id] unknown devices seen again
+        self.ipChanges = []     # [(ip, id)] known devices with a new ip
+        self.wentOffline = []   # [id] known devices missing from the scan
+        self.promotions = []    # [mac] unknown devices that are now known
+
+        # Context for change events, not written to the tables
+        self.knownChanges = []  # [(mac, name, previousIp, ip)] for every ipChanges/wentOffline entry
+        self.flapping = []      # [(mac, [ip, ...])] MACs that answered from more than one ip in this scan
+
+    def isEmpty(self):
+        return not (self.inserts or self.refreshes or self.ipChanges or self.wentOffline or self.promotions)
+
+    def __len__(self):
+        return len(self.inserts) + len(self.refreshes) + len(self.ipChanges) + len(self.wentOffline) + len(self.promotions)
+
+    def __repr__(self):
+        return (f'ScanDelta(inserts={len(self.inserts)}, refreshes={len(self.refreshes)}, '
+                f'ipChanges={len(self.ipChanges)}, wentOffline={len(self.wentOffline)}, '
+                f'promotions={len(self.promotions)})')
+
+class Reconciler:
+    OFFLINE_IP = None
+
+    @staticmethod
+    def indexByMac(entries): # [{'mac': x, ...}] -> {x: {'mac': x, ...}}
+        return {entry['mac']: entry for entry in entries}
+
+    @staticmethod
+    def indexArp(arpResult, delta): # [{'ip': x, 'mac': x}] -> {mac: ip}
+        # Last reply wins when a MAC answers more than once, same as the old nested loop
+        arpByMac = {}
+        ipByInterface = {} # (interface, mac) -> ip
+        conflicts = None
+
+        for arpDict in arpResult:
+            mac, ip = arpDict['mac'], arpDict['ip']
+
+            # Routers and L3 switches answer with one MAC on every VLAN, so only two ips for a MAC
+            # on the same interface count as flapping
+            key = (arpDict.get('interface'), mac)
+            previousIp = ipByInterface.get(key)
+
+            if previousIp is not None and previousIp != ip:
+                conflicts = conflicts or {}
+                conflicts.setdefault(mac, [previousIp])
+                if ip not in conflicts[mac]:
+                    conflicts[mac].append(ip)
+
+            ipByInterface[key] = ip
+            arpByMac[mac] = ip
+
+        if conflicts:
+            delta.flapping = list(conflicts.items())
+
+        return arpByMac
+
+    @staticmethod
+    def reconcile(knownEntries, unknownEntries, arpResult, partial=False) -> ScanDelta:
+        # partial: arpResult is a subset of the network, so absent known hosts are not marked offline
+        knownByMac = Reconciler.indexByMac(knownEntries)
+        unknownByMac = Reconciler.indexByMac(unknownEntries)
+        delta = ScanDelta()
+
+        arpByMac = Reconciler.indexArp(arpResult, delta)
+
+        for mac, ip in arpByMac.items():
+            knownEntry = knownByMac.get(mac)
+
+            if knownEntry is not None:
+                if knownEntry['ip'] != ip:
+                    delta.ipChanges.append((ip, knownEntry['id']))
+                    delta.knownChanges.append((mac, knownEntry['name'], knownEntry['ip'], ip))
+                continue
+
+            unknownEntry = unknownByMac.get(mac)
+
+            if unknownEntry is None:
+                delta.inserts.append((ip, mac))
+            else:
+                delta.refreshes.append(unknownEntry['id'])
+
+        for mac, knownEntry in knownByMac.items():
+            if not partial and mac not in arpByMac and knownEntry['ip'] is not Reconciler.OFFLINE_IP:
+                delta.wentOffline.append(knownEntry['id'])
+                delta.knownChanges.append((mac, knownEntry['name'], knownEntry['ip'], Reconciler.OFFLINE_IP))
+
+            if mac in unknownByMac:
+                delta.promotions.append(mac)
+
+        return delta
+
+    @staticmethod
+    def reconcileUnknown(knownMacs, unknownEntries, arpResult) -> ScanDelta:
+        # Unknown-only pass: the known side is just a membership test, so a cached MAC set is enough
+        unknownByMac = Reconciler.indexByMac(unknownEntries)
+        delta = ScanDelta()
+
+        arpByMac = Reconciler.indexArp(arpResult, delta)
+
+        for mac, ip in arpByMac.items():
+            if mac in knownMacs:
+                continue
+
+            unknownEntry = unknownByMac.get(mac)
+
+            if unknownEntry is None:
+                delta.inserts.append((ip, mac))
+            else:
+                delta.refreshes.append(unknownEntry['id'])
+
+        delta.promotions = [mac for mac in unknownByMac if mac in knownMacs]
+
+        return delta
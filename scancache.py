@@ -0,0 +1,67 @@
+import fcntl
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+
+class ScanCache:
+    # Scan results shared between arpmanager processes through the scanCache table of arp.db.
+    # Connections are opened per call so the cache works from scanner threads and never
+    # commits inside a caller's transaction.
+    def __init__(self, databasePath, ttl=30, maxEntries=32, busyTimeout=5.0):
+        self.databasePath = databasePath
+        self.lockPath = f'{databasePath}.scanlock'
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self.busyTimeout = busyTimeout
+
+    @staticmethod
+    def getKey(backend, target):
+        return f"{backend}|{target.get('interface') or ''}|{target.get('cidr') or ''}"
+
+    def isEnabled(self):
+        return bool(self.ttl)
+
+    def get(self, key): # -> [{'ip': x, 'mac': x}] | None
+        now = time.time()
+
+        with self.__connect() as connection:
+            row = connection.execute('SELECT result FROM scanCache WHERE target=? AND scannedAt > ?',
+                                     (key, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+
+            connection.execute('UPDATE scanCache SET lastUsed=? WHERE target=?', (now, key))
+
+        return json.loads(row[0])
+
+    def put(self, key, arpResult) -> None:
+        now = time.time()
+
+        with self.__connect() as connection:
+            connection.execute('''INSERT INTO scanCache (target, result, scannedAt, lastUsed) VALUES (?, ?, ?, ?)
+                ON CONFLICT(target) DO UPDATE SET result=excluded.result, scannedAt=excluded.scannedAt, lastUsed=excluded.lastUsed''',
+                (key, json.dumps(arpResult, separators=(',', ':')), now, now))
+
+            # Least recently used segments go first once the cache is over its limit
+            connection.execute('''DELETE FROM scanCache WHERE target NOT IN (
+                SELECT target FROM scanCache ORDER BY lastUsed DESC LIMIT ?)''', (self.maxEntries,))
+
+    @contextmanager
+    def lock(self):
+        # Concurrent invocations queue here; the first one scans and the rest find its result in the cache
+        with open(self.lockPath, 'a') as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+    @contextmanager
+    def __connect(self):
+        connection = sqlite3.connect(self.databasePath, timeout=self.busyTimeout)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+
+from addresses import canonicalMac
+
+class QueryError(Exception):
+    pass
+
+class QueryServer:
+    # Answers newline-delimited JSON requests on a Unix socket from one warm process, so polling
+    # clients skip interpreter startup, imports and reopening the database on every call.
+    # Queries run on the event loop thread, the only one touching the connection; they are short
+    # enough that many concurrent clients are served one after the other without threads.
+    def __init__(self, knownTable, unknownTable, tableUpdater, networker, socketPath):
+        self.tables = {'known': knownTable, 'unknown': unknownTable}
+        self.tableUpdater = tableUpdater
+        self.networker = networker
+        self.socketPath = socketPath
+
+        self.updateLock = None
+        self.stopping = None
+        self.operations = {
+            'ping': self.ping,
+            'select': self.select,
+            'lookup': self.lookup,
+            'insert': self.insert,
+            'delete': self.delete,
+            'update': self.update,
+        }
+
+    def run(self) -> None:
+        asyncio.run(self.runAsync())
+
+    async def runAsync(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.updateLock = asyncio.Lock()
+
+        for signalNumber in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signalNumber, self.stopping.set)
+
+        # A socket left behind by a server that did not shut down cleanly would make the bind fail,
+        # but one a running server still answers on is left alone
+        if os.path.exists(self.socketPath):
+            if QueryServer.isServing(self.socketPath):
+                print(f'Another server is already listening on {self.socketPath}')
+                return
+            os.remove(self.socketPath)
+
+        server = await asyncio.start_unix_server(self.__handle, self.socketPath)
+        os.chmod(self.socketPath, 0o660)
+        print(f'Serving queries on {self.socketPath}')
+
+        try:
+            await self.stopping.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+            self.tableUpdater.close()
+
+    @staticmethod
+    def isServing(socketPath) -> bool:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socketPath)
+            return True
+        except OSError:
+            return False
+        finally:
+            probe.close()
+
+    async def __handle(self, reader, writer) -> None:
+        # A client may send any number of requests on one connection; each gets one response line
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                response = await self.answer(line)
+                writer.write(json.dumps(response, separators=(',', ':')).encode() + b'\n')
+                await writer.drain()
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def answer(self, line): # bytes -> {'ok': True, 'result': x} | {'ok': False, 'error': x}
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise QueryError('Request must be a JSON object')
+
+            operation = self.operations.get(request.get('op'))
+            if operation is None:
+                raise QueryError(f"Unknown op: {request.get('op')}")
+
+            result = operation(request)
+            if asyncio.iscoroutine(result):
+                result = await result
+
+            return {'ok': True, 'result': result}
+
+        except (QueryError, ValueError, KeyError) as e:
+            return {'ok': False, 'error': str(e)}
+
+        except Exception as e:
+            print(f'Error when answering query @QueryServer: {e}')
+            return {'ok': False, 'error': 'Internal error'}
+
+    def getTable(self, request):
+        table = self.tables.get(request.get('table'))
+        if table is None:
+            raise QueryError(f"Invalid table: {request.get('table')}")
+        return table
+
+    def getColumn(self, table, request):
+        # Column names end up in the SQL text, so only the table's own columns are accepted
+        column = request.get('column')
+        if column not in table.getColumns():
+            raise QueryError(f"Invalid column: {column}")
+        return column
+
+    def getChanges(self, table, write): # runs write, -> rows it changed
+        before = table.connection.total_changes
+        write()
+        return table.connection.total_changes - before
+
+    def ping(self, request):
+        return 'pong'
+
+    def select(self, request): # -> [{'id': x, 'mac': x, ...}]
+        # Same push-down as -s: 'where' is [[column, value], ...], 'after' pages by id
+        table = self.getTable(request)
+        sql, params = table.buildSelect(request.get('columns'), request.get('where'), request.get('limit'),
+                                        request.get('offset'), request.get('after'))
+        return [dict(entry) for entry in table.connection.execute(sql, params)]
+
+    def lookup(self, request): # -> {'id': x, 'mac': x, ...} | None
+        table = self.getTable(request)
+        column = self.getColumn(table, request)
+        value = request.get('value')
+
+        if column == 'mac':
+            # The known-mac path is answered from the in-memory set before touching SQLite
+            value = canonicalMac(value)
+            if value not in table.getMacSet():
+                return None
+
+        entry = table.getEntryByColumn(column, value)
+        return dict(entry) if entry is not None else None
+
+    def insert(self, request): # -> rows changed
+        table = self.getTable(request)
+        canonicalMac(request['mac'])  # rejects a malformed MAC with an error instead of a no-op
+        return self.getChanges(table, lambda: table.insertRow(request['nameIp'], request['mac']))
+
+    def delete(self, request): # -> rows changed
+        table = self.getTable(request)
+        column = self.getColumn(table, request)
+        return self.getChanges(table, lambda: table.deleteRowByColumn(column, request['value']))
+
+    async def update(self, request): # -> {'hosts': x}
+        # The scan blocks on the network, so it runs off-loop while readers keep being answered
+        async with self.updateLock:
+            fresh = self.networker.fresh
+            self.networker.fresh = fresh or bool(request.get('fresh'))
+            try:
+                arpResult = await asyncio.get_running_loop().run_in_executor(None, self.networker.getUncachedArp)
+            finally:
+                self.networker.fresh = fresh
+
+            self.tableUpdater.update(arpResult=arpResult, expire=True)
+            return {'hosts': len(arpResult)}
@@ -0,0 +1,41 @@
+import asyncio
+import json
+import zlib
+
+import pytest
+
+import collector
+from collector import Aggregator, decodeFrame
+
+def frame(message):
+    return zlib.compress(json.dumps(message).encode())
+
+def testFrameInflatingPastMaxFrameIsRejected(monkeypatch):
+    monkeypatch.setattr(collector, 'MAX_FRAME', 1024)
+    body = zlib.compress(b'[' + b'0,' * 4096 + b'0]')
+
+    assert len(body) < 1024
+    with pytest.raises(ValueError):
+        decodeFrame(body)
+
+def testOversizedFrameGetsAnErrorResponse(tmp_path, monkeypatch):
+    monkeypatch.setattr(collector, 'MAX_FRAME', 1024)
+    aggregator = Aggregator(str(tmp_path), '127.0.0.1:0')
+
+    response = asyncio.run(aggregator.answer(frame({'op': 'sites', 'padding': ' ' * 4096})))
+
+    assert not response['ok']
+
+def testRequestsWithoutTheTokenAreRefused(tmp_path):
+    aggregator = Aggregator(str(tmp_path), '0.0.0.0:0', token='secret')
+
+    assert asyncio.run(aggregator.answer(frame({'op': 'sites'}))) == {'ok': False, 'error': 'Invalid token'}
+    assert asyncio.run(aggregator.answer(frame({'op': 'sites', 'token': 'wrong'})))['ok'] is False
+    assert asyncio.run(aggregator.answer(frame({'op': 'sites', 'token': 'secret'}))) == {'ok': True, 'result': []}
+
+def testListeningBeyondLoopbackNeedsAToken(tmp_path):
+    with pytest.raises(ValueError):
+        Aggregator(str(tmp_path), '0.0.0.0:7420')
+
+    Aggregator(str(tmp_path), 'localhost:7420')
+    Aggregator(str(tmp_path), '::1:7420')
@@ -0,0 +1,42 @@
+from events import FlapDetector, eventsFromDelta, MAC_FLAPPING
+from mainlite import Database
+from reconciler import ScanDelta
+
+def openConnection(path):
+    database = Database(str(path), 'knownEntries', 'unknownEntries')
+    database.createTables()
+    return database.getConnection()
+
+def ipChange(mac, previousIp, ip):
+    delta = ScanDelta()
+    delta.knownChanges.append((mac, 'Laptop', previousIp, ip))
+    return delta
+
+def flappingEvents(detector, delta, seen):
+    return [event for event in eventsFromDelta(delta, flapDetector=detector, seen=seen) if event.kind == MAC_FLAPPING]
+
+def testFlapsAcrossSeparateRunsAreDetected(tmp_path):
+    ips = ['10.0.0.2', '10.0.0.3']
+    results = []
+
+    # Every scan gets a new connection and detector, like separate -u invocations
+    for scan in range(4):
+        detector = FlapDetector(600, 3, openConnection(tmp_path / 'arp.db'))
+        results.append(flappingEvents(detector, ipChange('02:00:00:00:00:02', ips[scan % 2], ips[(scan + 1) % 2]), 1000 + scan * 60))
+
+    assert [len(events) for events in results] == [0, 0, 0, 1]
+
+def testChangesOutsideWindowAreForgotten(tmp_path):
+    connection = openConnection(tmp_path / 'arp.db')
+
+    for scan in range(4):
+        flappingEvents(FlapDetector(600, 3, connection), ipChange('02:00:00:00:00:02', '10.0.0.2', '10.0.0.3'), 1000 + scan * 300)
+
+    # Only the changes of the last 600 seconds remain
+    assert connection.execute('SELECT count(*) FROM flapChanges').fetchone()[0] == 3
+
+def testInMemoryDetectorWithoutConnection():
+    detector = FlapDetector(600, 1)
+
+    assert not detector.isFlapping('02:00:00:00:00:02', 1000)
+    assert detector.isFlapping('02:00:00:00:00:02', 1010)
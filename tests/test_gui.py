@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt6.QtWidgets')
+
+from PyQt6.QtWidgets import QApplication
+
+from gui import EntryModel, UNKNOWN_COLUMNS
+
+@pytest.fixture(scope='module')
+def application():
+    return QApplication.instance() or QApplication([])
+
+@pytest.fixture
+def model(application):
+    model = EntryModel(UNKNOWN_COLUMNS)
+    model.signals = []
+
+    model.rowsRemoved.connect(lambda parent, first, last: model.signals.append(('removed', first, last)))
+    model.rowsInserted.connect(lambda parent, first, last: model.signals.append(('inserted', first, last)))
+    model.dataChanged.connect(lambda topLeft, bottomRight, roles: model.signals.append(
+        ('changed', topLeft.row(), topLeft.column(), bottomRight.row(), bottomRight.column())))
+    model.modelReset.connect(lambda: model.signals.append(('reset',)))
+    return model
+
+def createRows(ids, ip='10.0.0.{}'):
+    return [(id, ip.format(id), f'02:00:00:00:00:{id:02x}', '2024-01-01 00:00:00') for id in ids]
+
+def load(model, rows):
+    model.applyRows(rows)
+    model.signals.clear()
+
+def testFirstLoadInsertsAllRows(model):
+    model.applyRows(createRows([1, 2, 3]))
+
+    assert model.signals == [('inserted', 0, 2)]
+    assert model.rowCount() == 3
+    assert model.data(model.index(1, 0)) == '10.0.0.2'
+
+def testNewRowsAreAppended(model):
+    load(model, createRows([1, 2, 3]))
+
+    model.applyRows(createRows([1, 2, 3, 4, 5]))
+
+    assert model.signals == [('inserted', 3, 4)]
+    assert [row[0] for row in model.rows] == [1, 2, 3, 4, 5]
+
+def testRemovedRowsGoBottomUpPerRun(model):
+    load(model, createRows([1, 2, 3, 4, 5, 6]))
+
+    model.applyRows(createRows([1, 4, 6]))
+
+    assert model.signals == [('removed', 4, 4), ('removed', 1, 2)]
+    assert [row[0] for row in model.rows] == [1, 4, 6]
+
+def testChangedRowsEmitDataChanged(model):
+    load(model, createRows([1, 2, 3]))
+
+    rows = createRows([1, 2, 3])
+    rows[1] = (2, '10.0.1.2') + rows[1][2:]
+    model.applyRows(rows)
+
+    assert model.signals == [('changed', 1, 0, 1, len(UNKNOWN_COLUMNS) - 1)]
+    assert model.data(model.index(1, 0)) == '10.0.1.2'
+
+def testUnchangedRowsEmitNothing(model):
+    load(model, createRows([1, 2, 3]))
+
+    model.applyRows(createRows([1, 2, 3]))
+
+    assert model.signals == []
+
+def testMixedUpdate(model):
+    load(model, createRows([1, 2, 3]))
+
+    rows = createRows([1, 3, 4])
+    rows[0] = (1, '10.0.1.1') + rows[0][2:]
+    model.applyRows(rows)
+
+    assert model.signals == [('removed', 1, 1), ('changed', 0, 0, 0, len(UNKNOWN_COLUMNS) - 1), ('inserted', 2, 2)]
+    assert model.rows == rows
+
+def testOutOfOrderIdResetsModel(model):
+    load(model, createRows([5, 6]))
+
+    model.applyRows(createRows([2, 5, 6]))
+
+    assert model.signals == [('reset',)]
+    assert [row[0] for row in model.rows] == [2, 5, 6]
@@ -0,0 +1,59 @@
+import pytest
+
+import inventory
+from mainlite import Database, Table
+
+CSV = '''mac,name,ip
+00:1A:2B:3C:4D:5E,Printer,10.0.0.5
+ 02-00-00-00-00-07 ,Laptop,
+not-a-mac,Broken,
+,Nameless,
+00:1a:2b:3c:4d:5e0,TooLong,
+'''
+
+def openKnownTable(path):
+    database = Database(str(path), 'knownEntries', 'unknownEntries')
+    database.createTables()
+    return Table(database.getKnownTableName(), 1, database.getCursor(), database.getConnection())
+
+def checkImport(table, changed, invalid):
+    assert changed == 2
+    assert sorted(record['name'] for record, _ in invalid) == ['Broken', 'Nameless', 'TooLong']
+    assert sorted((entry['name'], entry['mac'], entry['ip']) for entry in table.iterEntries()) == [
+        ('Laptop', '02:00:00:00:00:07', None), ('Printer', '00:1a:2b:3c:4d:5e', '10.0.0.5')]
+
+@pytest.mark.parametrize('withPyarrow', [True, False])
+def testCsvImport(tmp_path, monkeypatch, withPyarrow):
+    if withPyarrow:
+        pytest.importorskip('pyarrow')
+    else:
+        monkeypatch.setattr(inventory, 'findPyarrowCompute', lambda: None)
+
+    path = tmp_path / 'assets.csv'
+    path.write_text(CSV)
+    table = openKnownTable(tmp_path / 'arp.db')
+
+    checkImport(table, *inventory.importFile(table, str(path)))
+
+def testParquetImport(tmp_path):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+
+    path = tmp_path / 'assets.parquet'
+    pyarrow.parquet.write_table(pyarrow.table({
+        'mac': ['00:1A:2B:3C:4D:5E', '02-00-00-00-00-07', 'not-a-mac', None, '00:1a:2b:3c:4d:5e0'],
+        'name': ['Printer', 'Laptop', 'Broken', 'Nameless', 'TooLong'],
+        'ip': ['10.0.0.5', None, None, None, None],
+    }), path)
+    table = openKnownTable(tmp_path / 'arp.db')
+
+    checkImport(table, *inventory.importFile(table, str(path)))
+
+def testMatchMacsAgreesWithoutPyarrow(monkeypatch):
+    pytest.importorskip('pyarrow')
+    records = [{'mac': mac} for mac in ('00:1A:2B:3C:4D:5E', '00-1a-2b-3c-4d-5e', '001a2b3c4d5e', 'zz:1a:2b:3c:4d:5e', '', None, ' 00:1a:2b:3c:4d:5e\n')]
+
+    columnar = inventory.matchMacs(records)
+    monkeypatch.setattr(inventory, 'findPyarrowCompute', lambda: None)
+
+    assert columnar == inventory.matchMacs(records)
@@ -0,0 +1,83 @@
+import sqlite3
+
+from mainlite import Database
+
+def createBaselineDatabase(path):
+    # The schema as it was before versioning, with user_version 0
+    connection = sqlite3.connect(path)
+    connection.execute('''CREATE TABLE knownEntries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        mac TEXT NOT NULL UNIQUE,
+        ip TEXT,
+        time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    connection.execute('''CREATE TABLE unknownEntries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ip TEXT NOT NULL,
+        mac TEXT NOT NULL UNIQUE,
+        time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+    connection.executemany('INSERT INTO knownEntries (id, name, mac, ip, time) VALUES (?, ?, ?, ?, ?)', [
+        (1, 'Dev1', '00:1A:2B:3C:4D:5E', 'NULL', '2024-01-01 00:00:00'),
+        (2, 'Dev1b', '00:1a:2b:3c:4d:5e', '10.0.0.2', '2024-01-02 00:00:00'),
+        (3, 'Dev2', '00-1a-2b-3c-4d-5f', '10.0.0.3', '2024-01-03 00:00:00'),
+        (4, 'Broken', 'not a mac', 'NULL', '2024-01-04 00:00:00'),
+    ])
+    connection.executemany('INSERT INTO unknownEntries (id, ip, mac, time) VALUES (?, ?, ?, ?)', [
+        (1, '10.0.0.9', 'AA:BB:CC:DD:EE:FF', '2024-01-01 00:00:00'),
+        (2, '10.0.0.10', 'aa:bb:cc:dd:ee:ff', '2024-01-02 00:00:00'),
+        (3, '10.0.0.11', '02:00:00:00:00:01', '2024-01-03 00:00:00'),
+    ])
+    connection.commit()
+    connection.close()
+
+def migrate(path):
+    database = Database(str(path), 'knownEntries', 'unknownEntries')
+    assert database.needsMigration()
+    database.createTables()
+    return database
+
+def testMigratesBaselineRows(tmp_path):
+    path = tmp_path / 'arp.db'
+    createBaselineDatabase(path)
+    database = migrate(path)
+
+    assert database.getSchemaVersion() == Database.SCHEMA_VERSION
+
+    known = [tuple(row) for row in database.getConnection().execute('SELECT id, name, mac, ip, time FROM knownEntries ORDER BY id')]
+    assert known == [
+        (1, 'Dev1', '00:1a:2b:3c:4d:5e', None, '2024-01-01 00:00:00'),
+        (3, 'Dev2', '00:1a:2b:3c:4d:5f', '10.0.0.3', '2024-01-03 00:00:00'),
+    ]
+
+    unknown = [tuple(row) for row in database.getConnection().execute('SELECT id, ip, mac FROM unknownEntries ORDER BY id')]
+    assert unknown == [(1, '10.0.0.9', 'aa:bb:cc:dd:ee:ff'), (3, '10.0.0.11', '02:00:00:00:00:01')]
+
+def testStoresAddressesAsIntegers(tmp_path):
+    path = tmp_path / 'arp.db'
+    createBaselineDatabase(path)
+    migrate(path).getConnection().close()
+
+    connection = sqlite3.connect(path)
+    assert connection.execute("SELECT typeof(mac), typeof(ip) FROM knownEntries WHERE id = 3").fetchone() == ('integer', 'integer')
+    assert connection.execute("SELECT ip FROM knownEntries WHERE id = 1").fetchone() == (None,)
+    assert connection.execute("SELECT mac FROM unknownEntries WHERE id = 1").fetchone() == (0xaabbccddeeff,)
+
+def testReportsDroppedRows(tmp_path, capsys):
+    path = tmp_path / 'arp.db'
+    createBaselineDatabase(path)
+    migrate(path)
+
+    output = capsys.readouterr().out
+    assert 'row 2 of knownEntries' in output and 'duplicate of row 1' in output
+    assert 'row 4 of knownEntries' in output
+    assert 'row 2 of unknownEntries' in output
+
+def testMigratedDatabaseIsCurrent(tmp_path):
+    path = tmp_path / 'arp.db'
+    createBaselineDatabase(path)
+    migrate(path).getConnection().close()
+
+    assert not Database(str(path), 'knownEntries', 'unknownEntries').needsMigration()
@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from arpscanner import FakeTransport
+from commands import UpdateCommand
+from config import Config
+from mainlite import Database, Networker, Table, TableUpdater
+
+HOSTS = {'10.0.0.2': '02:00:00:00:00:02', '10.0.0.5': '02:00:00:00:00:05'}
+
+def createConfig():
+    return Config({
+        'scanner': {'backend': 'native', 'targets': [{'interface': 'fake0', 'cidr': '10.0.0.0/29'}],
+                    'retries': 1, 'timeout': 0.05, 'rate': 0},
+        'history': {'enabled': False},
+    })
+
+def createFakeTransport(interface):
+    return FakeTransport(HOSTS, network='10.0.0.0/29', ip='10.0.0.1', interface=interface)
+
+def failingTransport(interface):
+    raise PermissionError(1, 'Operation not permitted')
+
+def openTables(path):
+    database = Database(str(path), 'knownEntries', 'unknownEntries')
+    database.createTables()
+    return (Table(database.getKnownTableName(), 1, database.getCursor(), database.getConnection()),
+            Table(database.getUnknownTableName(), 0, database.getCursor(), database.getConnection()))
+
+def testNativeScanThroughFakeTransport():
+    networker = Networker(createConfig(), Transport=createFakeTransport)
+
+    arpResult = sorted(networker.getUncachedArp(), key=lambda arpDict: arpDict['ip'])
+
+    assert arpResult == [{'ip': ip, 'mac': mac, 'interface': 'fake0'} for ip, mac in sorted(HOSTS.items())]
+
+def testUpdateWritesNativeScan(tmp_path):
+    knownTable, unknownTable = openTables(tmp_path / 'arp.db')
+    knownTable.insertRow('Printer', '02:00:00:00:00:05')
+
+    tableUpdater = TableUpdater(knownTable, unknownTable, Networker(createConfig(), Transport=createFakeTransport), createConfig())
+    tableUpdater.update()
+
+    assert knownTable.getEntryByColumn('mac', '02:00:00:00:00:05')['ip'] == '10.0.0.5'
+    assert unknownTable.getEntryByColumn('mac', '02:00:00:00:00:02')['ip'] == '10.0.0.2'
+
+def testFailedSocketRaises():
+    networker = Networker(createConfig(), Transport=failingTransport)
+
+    with pytest.raises(OSError):
+        networker.getUncachedArp()
+
+def testFailedSocketLeavesHostsOnline(tmp_path, capsys):
+    knownTable, unknownTable = openTables(tmp_path / 'arp.db')
+    knownTable.insertRow('Printer', '02:00:00:00:00:05')
+    knownTable.updateColumnValueByColumn('mac', '02:00:00:00:00:05', 'ip', '10.0.0.5')
+
+    command = UpdateCommand(knownTable, unknownTable, Networker(createConfig(), Transport=failingTransport), TableUpdater, createConfig())
+
+    assert command.execute() == 0
+    assert 'Operation not permitted' in capsys.readouterr().out
+    assert knownTable.getEntryByColumn('mac', '02:00:00:00:00:05')['ip'] == '10.0.0.5'
+
+def createFailingArpScan(directory, monkeypatch):
+    # arp-scan runs through sudo, so a fake sudo first on PATH stands in for the whole command
+    fakeSudo = directory / 'sudo'
+    fakeSudo.write_text('#!/bin/sh\necho "ioctl: No such device" >&2\nexit 1\n')
+    fakeSudo.chmod(0o755)
+    monkeypatch.setenv('PATH', f"{directory}{os.pathsep}{os.environ['PATH']}")
+
+def testFailedArpScanLeavesHostsOnline(tmp_path, monkeypatch, capsys):
+    createFailingArpScan(tmp_path, monkeypatch)
+    config = Config({'scanner': {'backend': 'arp-scan'}, 'history': {'enabled': False}})
+
+    knownTable, unknownTable = openTables(tmp_path / 'arp.db')
+    knownTable.insertRow('Printer', '02:00:00:00:00:05')
+    knownTable.updateColumnValueByColumn('mac', '02:00:00:00:00:05', 'ip', '10.0.0.5')
+
+    command = UpdateCommand(knownTable, unknownTable, Networker(config), TableUpdater, config)
+
+    assert command.execute() == 0
+    assert 'ioctl: No such device' in capsys.readouterr().out
+    assert knownTable.getEntryByColumn('mac', '02:00:00:00:00:05')['ip'] == '10.0.0.5'
+
+def testEveryUpdateScansAgain(tmp_path):
+    hosts = dict(HOSTS)
+    networker = Networker(createConfig(), Transport=lambda interface: FakeTransport(hosts, network='10.0.0.0/29', ip='10.0.0.1', interface=interface))
+    knownTable, unknownTable = openTables(tmp_path / 'arp.db')
+    knownTable.insertRow('Printer', '02:00:00:00:00:05')
+    tableUpdater = TableUpdater(knownTable, unknownTable, networker, createConfig())
+
+    tableUpdater.update()
+    del hosts['10.0.0.5']
+    tableUpdater.update()
+
+    # The second update sees the printer gone rather than reusing the first sweep
+    assert knownTable.getEntryByColumn('mac', '02:00:00:00:00:05')['ip'] is None
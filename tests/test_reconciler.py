@@ -0,0 +1,91 @@
+from reconciler import Reconciler, ScanDelta
+
+def known(id, mac, ip, name=None):
+    return {'id': id, 'mac': mac, 'ip': ip, 'name': name or f'device{id}'}
+
+def unknown(id, mac, ip):
+    return {'id': id, 'mac': mac, 'ip': ip, 'time': '2024-01-01 00:00:00'}
+
+def arp(ip, mac, interface=None):
+    return {'ip': ip, 'mac': mac, 'interface': interface}
+
+def testNewHostIsInserted():
+    delta = Reconciler.reconcile([], [], [arp('10.0.0.2', '02:00:00:00:00:02')])
+
+    assert delta.inserts == [('10.0.0.2', '02:00:00:00:00:02')]
+    assert len(delta) == 1
+
+def testSeenUnknownHostIsRefreshed():
+    delta = Reconciler.reconcile([], [unknown(7, '02:00:00:00:00:02', '10.0.0.2')], [arp('10.0.0.2', '02:00:00:00:00:02')])
+
+    assert delta.refreshes == [7]
+    assert delta.inserts == []
+
+def testKnownHostWithNewIpChanges():
+    delta = Reconciler.reconcile([known(3, '02:00:00:00:00:03', '10.0.0.3', 'Printer')], [], [arp('10.0.0.30', '02:00:00:00:00:03')])
+
+    assert delta.ipChanges == [('10.0.0.30', 3)]
+    assert delta.knownChanges == [('02:00:00:00:00:03', 'Printer', '10.0.0.3', '10.0.0.30')]
+
+def testKnownHostWithSameIpIsUnchanged():
+    delta = Reconciler.reconcile([known(3, '02:00:00:00:00:03', '10.0.0.3')], [], [arp('10.0.0.3', '02:00:00:00:00:03')])
+
+    assert delta.isEmpty()
+    assert delta.knownChanges == []
+
+def testMissingKnownHostGoesOffline():
+    delta = Reconciler.reconcile([known(3, '02:00:00:00:00:03', '10.0.0.3', 'Printer'), known(4, '02:00:00:00:00:04', None)], [], [])
+
+    # Only hosts that were online go offline
+    assert delta.wentOffline == [3]
+    assert delta.knownChanges == [('02:00:00:00:00:03', 'Printer', '10.0.0.3', Reconciler.OFFLINE_IP)]
+
+def testPartialScanKeepsMissingHostsOnline():
+    delta = Reconciler.reconcile([known(3, '02:00:00:00:00:03', '10.0.0.3')], [], [], partial=True)
+
+    assert delta.isEmpty()
+
+def testKnownMacInUnknownTableIsPromoted():
+    delta = Reconciler.reconcile([known(3, '02:00:00:00:00:03', '10.0.0.3')], [unknown(9, '02:00:00:00:00:03', '10.0.0.3')],
+                                 [arp('10.0.0.3', '02:00:00:00:00:03')])
+
+    assert delta.promotions == ['02:00:00:00:00:03']
+    assert delta.refreshes == []
+
+def testMixedScan():
+    knownEntries = [known(1, '02:00:00:00:00:01', '10.0.0.1'), known(2, '02:00:00:00:00:02', '10.0.0.2')]
+    unknownEntries = [unknown(5, '02:00:00:00:00:05', '10.0.0.5'), unknown(6, '02:00:00:00:00:01', '10.0.0.1')]
+    arpResult = [arp('10.0.0.11', '02:00:00:00:00:01'), arp('10.0.0.5', '02:00:00:00:00:05'), arp('10.0.0.7', '02:00:00:00:00:07')]
+
+    delta = Reconciler.reconcile(knownEntries, unknownEntries, arpResult)
+
+    assert delta.inserts == [('10.0.0.7', '02:00:00:00:00:07')]
+    assert delta.refreshes == [5]
+    assert delta.ipChanges == [('10.0.0.11', 1)]
+    assert delta.wentOffline == [2]
+    assert delta.promotions == ['02:00:00:00:00:01']
+    assert len(delta) == 5
+
+def testReconcileUnknownOnlyTouchesUnknownTable():
+    delta = Reconciler.reconcileUnknown({'02:00:00:00:00:01'}, [unknown(6, '02:00:00:00:00:01', '10.0.0.1'), unknown(5, '02:00:00:00:00:05', '10.0.0.5')],
+                                        [arp('10.0.0.1', '02:00:00:00:00:01'), arp('10.0.0.5', '02:00:00:00:00:05'), arp('10.0.0.7', '02:00:00:00:00:07')])
+
+    assert delta.inserts == [('10.0.0.7', '02:00:00:00:00:07')]
+    assert delta.refreshes == [5]
+    assert delta.promotions == ['02:00:00:00:00:01']
+    assert delta.ipChanges == [] and delta.wentOffline == []
+
+def testSameInterfaceConflictIsFlapping():
+    delta = Reconciler.reconcile([], [], [arp('10.0.0.2', '02:00:00:00:00:02', 'eth0'), arp('10.0.0.3', '02:00:00:00:00:02', 'eth0')])
+
+    assert delta.flapping == [('02:00:00:00:00:02', ['10.0.0.2', '10.0.0.3'])]
+
+def testRouterOnSeveralInterfacesIsNotFlapping():
+    delta = Reconciler.reconcile([], [], [arp('10.0.1.1', '02:00:00:00:00:01', 'eth0.1'), arp('10.0.2.1', '02:00:00:00:00:01', 'eth0.2')])
+
+    assert delta.flapping == []
+
+def testEmptyDelta():
+    delta = ScanDelta()
+
+    assert delta.isEmpty() and len(delta) == 0
@@ -0,0 +1,72 @@
+import json
+
+from commands import SelectCommand
+from mainlite import Database, Table
+
+def openTables(path):
+    database = Database(str(path), 'knownEntries', 'unknownEntries')
+    database.createTables()
+    knownTable = Table(database.getKnownTableName(), 1, database.getCursor(), database.getConnection())
+    unknownTable = Table(database.getUnknownTableName(), 0, database.getCursor(), database.getConnection())
+
+    knownTable.insertRow('Printer', '02:00:00:00:00:05')
+    unknownTable.insertRow('10.0.0.7', '02:00:00:00:00:07')
+    return knownTable, unknownTable
+
+def testJsonOfBothTablesIsOneDocument(tmp_path, capsys):
+    command = SelectCommand(*openTables(tmp_path / 'arp.db'))
+
+    assert command.execute(['--format', 'json', '--columns', 'mac']) == 1
+
+    assert json.loads(capsys.readouterr().out) == {'unknown': [{'mac': '02:00:00:00:00:07'}], 'known': [{'mac': '02:00:00:00:00:05'}]}
+
+def testJsonOfOneTableIsAnArray(tmp_path, capsys):
+    command = SelectCommand(*openTables(tmp_path / 'arp.db'))
+
+    assert command.execute(['known', '--format', 'json', '--columns', 'name,mac']) == 1
+
+    assert json.loads(capsys.readouterr().out) == [{'name': 'Printer', 'mac': '02:00:00:00:00:05'}]
+
+def testJsonLinesOfBothTables(tmp_path, capsys):
+    command = SelectCommand(*openTables(tmp_path / 'arp.db'))
+
+    assert command.execute(['--format', 'jsonl', '--columns', 'mac']) == 1
+
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == [{'mac': '02:00:00:00:00:07'}, {'mac': '02:00:00:00:00:05'}]
+
+def testCsvNeedsTable(tmp_path, capsys):
+    command = SelectCommand(*openTables(tmp_path / 'arp.db'))
+
+    assert command.execute(['--format', 'csv']) == 0
+    assert '--format csv needs a table' in capsys.readouterr().out
+
+class VendorIndex:
+    def lookup(self, mac):
+        return 'Vendor'
+
+def countingLoader(loads):
+    def loadIndex():
+        loads.append(1)
+        return VendorIndex()
+    return loadIndex
+
+def testOuiIndexIsNotLoadedWithoutVendor(tmp_path, capsys):
+    loads = []
+    command = SelectCommand(*openTables(tmp_path / 'arp.db'), countingLoader(loads))
+
+    assert command.execute(['known']) == 1
+    assert command.execute(['unknown', '--format', 'json']) == 1
+    assert command.execute(['unknown', '--columns', 'mac,ip']) == 1
+
+    assert loads == []
+
+def testOuiIndexIsLoadedForVendor(tmp_path, capsys):
+    loads = []
+    command = SelectCommand(*openTables(tmp_path / 'arp.db'), countingLoader(loads))
+
+    assert command.execute(['known', '--format', 'json', '--columns', 'mac,vendor']) == 1
+    assert json.loads(capsys.readouterr().out) == [{'mac': '02:00:00:00:00:05', 'vendor': 'Vendor'}]
+
+    assert command.execute(['unknown']) == 1
+    assert 'Vendor' in capsys.readouterr().out
+    assert len(loads) == 2
@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+
+from config import Config
+from mainlite import Database, Table, TableUpdater
+
+def openTables(path):
+    database = Database(str(path), 'knownEntries', 'unknownEntries')
+    database.createTables()
+    return (Table(database.getKnownTableName(), 1, database.getCursor(), database.getConnection()),
+            Table(database.getUnknownTableName(), 0, database.getCursor(), database.getConnection()))
+
+def createTableUpdater(knownTable, unknownTable):
+    return TableUpdater(knownTable, unknownTable, None, Config({'history': {'enabled': False}}))
+
+def snapshot(table):
+    return sorted(tuple(entry) for entry in table.iterEntries())
+
+def testFailedWriteRollsBackWholeScan(tmp_path):
+    knownTable, unknownTable = openTables(tmp_path / 'arp.db')
+    knownTable.insertRow('Printer', '02:00:00:00:00:05')
+    unknownTable.insertRow('10.0.0.5', '02:00:00:00:00:05')
+    knownBefore, unknownBefore = snapshot(knownTable), snapshot(unknownTable)
+
+    # Promotions are deleted last, after the known ip and the new unknown hosts were written
+    knownTable.connection.execute("CREATE TRIGGER failDelete BEFORE DELETE ON unknownEntries BEGIN SELECT RAISE(ABORT, 'disk I/O error'); END")
+
+    arpResult = [{'ip': '10.0.0.5', 'mac': '02:00:00:00:00:05'}] + [{'ip': f'10.0.0.{n}', 'mac': f'02:00:00:00:01:{n:02x}'} for n in range(10, 15)]
+    with pytest.raises(sqlite3.Error, match='disk I/O error'):
+        createTableUpdater(knownTable, unknownTable).update(arpResult=arpResult)
+
+    assert snapshot(knownTable) == knownBefore
+    assert snapshot(unknownTable) == unknownBefore
+    assert not knownTable.connection.in_transaction
+
+def testRacingInsertDoesNotDropNewHosts(tmp_path):
+    knownTable, unknownTable = openTables(tmp_path / 'arp.db')
+    otherUnknownTable = openTables(tmp_path / 'arp.db')[1]
+
+    # Another writer adds one of the scan's new hosts between the reconcile read and the write
+    iterEntries = unknownTable.iterEntries
+    def racingIterEntries(*args):
+        yield from iterEntries(*args)
+        otherUnknownTable.insertRow('10.0.0.99', '02:00:00:00:00:03')
+    unknownTable.iterEntries = racingIterEntries
+
+    createTableUpdater(knownTable, unknownTable).update(arpResult=[{'ip': f'10.0.0.{n}', 'mac': f'02:00:00:00:00:{n:02x}'} for n in range(1, 6)])
+
+    assert sorted((entry['mac'], entry['ip']) for entry in iterEntries()) == [(f'02:00:00:00:00:{n:02x}', f'10.0.0.{n}') for n in range(1, 6)]
+
+def testBatchErrorOutsideTransactionIsPrinted(tmp_path, capsys):
+    knownTable, unknownTable = openTables(tmp_path / 'arp.db')
+    unknownTable.insertRow('10.0.0.5', '02:00:00:00:00:05')
+    knownTable.connection.execute("CREATE TRIGGER failDelete BEFORE DELETE ON unknownEntries BEGIN SELECT RAISE(ABORT, 'disk I/O error'); END")
+
+    unknownTable.deleteRowsByMac(['02:00:00:00:00:05'])
+
+    assert 'disk I/O error' in capsys.readouterr().out